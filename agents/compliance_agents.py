@@ -1,144 +1,306 @@
 from crewai import Agent
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from agents.compliance_report import ComplianceResult, render_report
+from agents.document_index import DocumentIndex
+from agents.rule_matcher import IncrementalMatch
+from agents.rule_registry import get_rule_registry
+from metrics import BYTES_PROCESSED, PAGES_EXTRACTED, STAGE_SECONDS
 import PyPDF2
+import mmap
+import multiprocessing
 import os
+import threading
+import time
+
+# Bump whenever a change alters extracted text, so cached extractions are invalidated
+EXTRACTOR_VERSION = "2"
+
+# Upper bound (in characters) on extracted text the extractor holds in memory at once
+EXTRACTOR_MEMORY_BUDGET = int(os.getenv("EXTRACTOR_MEMORY_BUDGET", 256 * 1024 * 1024))
+
+# Documents with fewer pages than this are always extracted serially
+PARALLEL_PAGE_THRESHOLD = int(os.getenv("EXTRACTOR_PARALLEL_THRESHOLD", 100))
+EXTRACTOR_WORKERS = int(os.getenv("EXTRACTOR_WORKERS", os.cpu_count() or 1))
+
+
+class ExtractionBudgetExceeded(MemoryError):
+    """Raised when extracted text would exceed the configured memory budget"""
+
+
+def is_pdf_path(file):
+    return isinstance(file, str) and file.endswith('.pdf') and os.path.exists(file)
+
+
+def is_pdf_file(file):
+    """True for a seekable binary file object holding a PDF (e.g. an upload)"""
+    if not (hasattr(file, 'read') and hasattr(file, 'seek')):
+        return False
+    position = file.tell()
+    try:
+        return file.read(5) == b'%PDF-'
+    finally:
+        file.seek(position)
+
+
+def is_pdf_source(file):
+    """A PDF path on disk or an open PDF file object"""
+    return is_pdf_path(file) or is_pdf_file(file)
+
+
+def _source_size(file):
+    if is_pdf_path(file):
+        return os.path.getsize(file)
+    position = file.tell()
+    size = file.seek(0, os.SEEK_END)
+    file.seek(position)
+    return size
+
+
+@contextmanager
+def _open_pdf(file):
+    """Yield something PdfReader can read: a memory map of a path, or the file object itself"""
+    if is_pdf_path(file):
+        with open(file, 'rb') as pdf_file:
+            with mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+    else:
+        file.seek(0)
+        yield file
+
+
+def _count_pages(path):
+    with open(path, 'rb') as pdf_file:
+        with mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return len(PyPDF2.PdfReader(mapped).pages)
+
+
+def _extract_page_range(path, start, stop):
+    """Extract pages [start, stop) of a PDF; runs inside a worker process"""
+    with open(path, 'rb') as pdf_file:
+        with mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            reader = PyPDF2.PdfReader(mapped)
+            return [(reader.pages[i].extract_text() or "") + "\n" for i in range(start, stop)]
+
+
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
+
+def _get_extraction_pool():
+    """Return the process-wide page extraction pool, starting it on first use"""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            _extraction_pool = ProcessPoolExecutor(max_workers=EXTRACTOR_WORKERS)
+        return _extraction_pool
+
+
+def _discard_extraction_pool(pool):
+    # A worker died; the next document gets a fresh pool
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is pool:
+            _extraction_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def in_worker_process():
+    """True inside a multiprocessing worker, e.g. a compliance API batch worker"""
+    return multiprocessing.parent_process() is not None
+
 
 class ExtractorAgent(Agent):
-    def parse_document(self, file):
-        # If it's a file path, read the PDF
-        if isinstance(file, str) and file.endswith('.pdf') and os.path.exists(file):
+    def parse_document(self, file, stream=False, memory_budget=None, workers=None):
+        # Streaming mode hands back a page generator instead of the joined text
+        if stream:
+            return self.iter_pages(file, memory_budget=memory_budget)
+
+        # If it's a PDF path or file object, read the PDF
+        if is_pdf_source(file):
+            budget = memory_budget or EXTRACTOR_MEMORY_BUDGET
+            workers = workers or EXTRACTOR_WORKERS
+            started = time.perf_counter()
             try:
-                with open(file, 'rb') as pdf_file:
-                    reader = PyPDF2.PdfReader(pdf_file)
-                    text = ""
-                    for page in reader.pages:  # Read all pages
-                        text += page.extract_text() + "\n"
-                    return text
+                # Worker processes reopen the file by path, so file objects are read serially.
+                # A process that is itself a pool worker already has its share of the CPUs
+                if workers > 1 and is_pdf_path(file) and not in_worker_process():
+                    page_count = _count_pages(file)
+                    if page_count >= PARALLEL_PAGE_THRESHOLD:
+                        return self.parse_document_parallel(file, page_count, workers, budget)
+
+                pages = []
+                held = 0
+                for page_text in self.iter_pages(file, memory_budget=budget):
+                    held += len(page_text)
+                    if held > budget:
+                        raise ExtractionBudgetExceeded(
+                            f"extracted text exceeds memory budget of {budget} characters"
+                        )
+                    pages.append(page_text)
+                return "".join(pages)
             except Exception as e:
                 return f"Error reading PDF: {str(e)}"
+            finally:
+                STAGE_SECONDS.labels("extract").observe(time.perf_counter() - started)
         else:
             # For text input, return as-is
             return f"Extracted text: {file}"
 
+    def parse_document_parallel(self, path, page_count, workers, memory_budget=None):
+        """
+        Extract a PDF by sharding its page range across the shared process pool
+
+        Each worker opens the file independently and extracts a contiguous
+        block of pages; the blocks are merged back in page order.
+
+        Args:
+            path: Path to the PDF
+            page_count: Number of pages in the document
+            workers: Number of shards to aim for per pass (two each)
+            memory_budget: Cap on total extracted text, as in parse_document
+
+        Returns:
+            The extracted text of all pages
+        """
+        budget = memory_budget or EXTRACTOR_MEMORY_BUDGET
+        # A couple of shards per worker evens out pages that are slow to extract
+        shard_count = min(page_count, workers * 2)
+        bounds = [page_count * i // shard_count for i in range(shard_count + 1)]
+
+        pages = []
+        held = 0
+        pool = _get_extraction_pool()
+        futures = [
+            pool.submit(_extract_page_range, path, start, stop) for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        try:
+            for future in futures:
+                shard = future.result()
+                held += sum(len(page_text) for page_text in shard)
+                if held > budget:
+                    raise ExtractionBudgetExceeded(
+                        f"extracted text exceeds memory budget of {budget} characters"
+                    )
+                pages.extend(shard)
+        except BrokenProcessPool:
+            _discard_extraction_pool(pool)
+            raise
+        finally:
+            for future in futures:
+                future.cancel()
+        PAGES_EXTRACTED.inc(page_count)
+        BYTES_PROCESSED.inc(os.path.getsize(path))
+        return "".join(pages)
+
+    def iter_pages(self, file, memory_budget=None):
+        """
+        Yield the text of a PDF one page at a time
+
+        A path is read through a read-only memory-mapped handle so the OS
+        pages it in on demand; a file object is read in place. Only the
+        current page's text is held by the extractor. Plain text input is
+        yielded as a single chunk.
+
+        Args:
+            file: Path to a PDF, a binary file object holding one, or a text string
+            memory_budget: Largest page text (in characters) the generator will
+                hold; defaults to EXTRACTOR_MEMORY_BUDGET
+
+        Yields:
+            Page text, each terminated by a newline
+        """
+        budget = memory_budget or EXTRACTOR_MEMORY_BUDGET
+        if not is_pdf_source(file):
+            yield f"Extracted text: {file}"
+            return
+
+        BYTES_PROCESSED.inc(_source_size(file))
+        with _open_pdf(file) as source:
+            reader = PyPDF2.PdfReader(source)
+            for page_number in range(len(reader.pages)):
+                page_text = (reader.pages[page_number].extract_text() or "") + "\n"
+                PAGES_EXTRACTED.inc()
+                if len(page_text) > budget:
+                    raise ExtractionBudgetExceeded(
+                        f"page {page_number + 1} exceeds memory budget of {budget} characters"
+                    )
+                yield page_text
+
+    def index_document(self, text):
+        """Build the tokenized DocumentIndex the matcher works from"""
+        return DocumentIndex(text)
+
 
 class MatcherAgent(Agent):
     def match_rules(self, text, jurisdiction):
-        # Define building construction requirements for each jurisdiction
-        building_requirements = {
-            "India": {
-                "keywords": ["building permit", "noc", "fire safety", "structural design", "environmental clearance", "municipal approval", "architect", "engineer", "foundation", "construction plan", "building code", "setback", "fsi", "far"],
-                "required_docs": [
-                    "Building Permit/Sanction Plan",
-                    "NOC from Fire Department", 
-                    "Structural Design Certificate",
-                    "Environmental Clearance",
-                    "Municipal Corporation Approval",
-                    "Architect/Engineer License",
-                    "Site Plan with Setbacks",
-                    "FSI/FAR Compliance Certificate"
-                ]
-            },
-            "EU": {
-                "keywords": ["building permit", "planning permission", "structural engineer", "energy certificate", "fire safety", "accessibility", "environmental impact", "building regulations", "construction standards", "architect license"],
-                "required_docs": [
-                    "Building Permit",
-                    "Planning Permission", 
-                    "Structural Engineer Certificate",
-                    "Energy Performance Certificate",
-                    "Fire Safety Compliance",
-                    "Accessibility Standards Compliance",
-                    "Environmental Impact Assessment"
-                ]
-            },
-            "UK": {
-                "keywords": ["planning permission", "building regulations", "structural engineer", "fire safety", "building control", "architect", "construction standards", "party wall", "environmental assessment", "drainage"],
-                "required_docs": [
-                    "Planning Permission",
-                    "Building Regulations Approval",
-                    "Structural Engineer Certificate", 
-                    "Fire Safety Certificate",
-                    "Building Control Approval",
-                    "Party Wall Agreement (if applicable)",
-                    "Drainage and Utilities Plan"
-                ]
-            }
-        }
-        
-        # Get requirements for jurisdiction
-        requirements = building_requirements.get(jurisdiction, {"keywords": [], "required_docs": []})
-        keywords = requirements["keywords"]
-        required_docs = requirements["required_docs"]
-        
-        # Analyze text for building construction content
-        text_lower = text.lower()
-        found_docs = []
-        missing_docs = []
-        keyword_count = 0
-        
-        # Count keyword matches and identify found documents
-        for keyword in keywords:
-            if keyword in text_lower:
-                keyword_count += 1
-        
-        # Check which required documents are mentioned
-        for doc in required_docs:
-            doc_keywords = doc.lower().split()
-            if any(keyword in text_lower for keyword in doc_keywords):
-                found_docs.append(doc)
-            else:
-                missing_docs.append(doc)
-        
-        # Calculate compliance score
-        total_docs = len(required_docs)
-        found_count = len(found_docs)
-        compliance_score = (found_count / total_docs) if total_docs > 0 else 0
-        
-        # Only proceed if most requirements are met
-        should_continue = compliance_score >= 0.8  # 80% of documents found
-        
+        # Get compiled requirements for jurisdiction from the current rules version
+        rule_snapshot = get_rule_registry().snapshot()
+        rules = rule_snapshot.get(jurisdiction)
+
+        # Analyze text for building construction content via index lookups
+        with STAGE_SECONDS.labels("match").time():
+            index = text if isinstance(text, DocumentIndex) else DocumentIndex(text)
+            keyword_count, found_docs, missing_docs = rules.match(index)
+        return self._build_result(rules, keyword_count, found_docs, missing_docs, rule_snapshot.version)
+
+    def start_match(self, jurisdiction):
+        """
+        Begin matching a document that is indexed page by page
+
+        Call update(index) on the returned IncrementalMatch after each page
+        and hand it to finish_match() at the end.
+        """
+        rule_snapshot = get_rule_registry().snapshot()
+        return IncrementalMatch(rule_snapshot.get(jurisdiction), rule_snapshot.version)
+
+    def finish_match(self, match, index):
+        """Turn an IncrementalMatch into a ComplianceResult; the pages are timed as one match"""
+        keyword_count, found_docs, missing_docs = match.result(index)
+        STAGE_SECONDS.labels("match").observe(match.seconds)
+        return self._build_result(match.rules, keyword_count, found_docs, missing_docs, match.rule_version)
+
+    def match_all(self, text):
+        """
+        Match text against every jurisdiction, indexing it only once
+
+        Returns:
+            dict with per-jurisdiction results (same shape as match_rules),
+            the best-fitting jurisdiction and the rule version used
+        """
+        rule_snapshot = get_rule_registry().snapshot()
+        index = text if isinstance(text, DocumentIndex) else DocumentIndex(text)
+
+        results = {}
+        with STAGE_SECONDS.labels("match").time():
+            for jurisdiction, rules in rule_snapshot.jurisdictions.items():
+                keyword_count, found_docs, missing_docs = rules.match(index)
+                results[jurisdiction] = self._build_result(
+                    rules, keyword_count, found_docs, missing_docs, rule_snapshot.version
+                )
+
+        # Best fit: highest compliance score, then most keywords found
+        best_jurisdiction = max(
+            results,
+            key=lambda name: (results[name].compliance_score, results[name].keywords_found),
+            default=None
+        )
         return {
-            "found_documents": found_docs,
-            "missing_documents": missing_docs,
-            "compliance_score": compliance_score,
-            "should_continue": should_continue,
-            "keywords_found": keyword_count,
-            "total_required": total_docs,
-            "analysis": f"Found {found_count}/{total_docs} required construction documents"
+            "jurisdictions": results,
+            "best_jurisdiction": best_jurisdiction,
+            "rule_version": rule_snapshot.version
         }
 
+    def _build_result(self, rules, keyword_count, found_docs, missing_docs, rule_version):
+        # Score and verdict (80% of documents found) are derived by ComplianceResult
+        return ComplianceResult(found_docs, missing_docs, keyword_count, len(rules.required_docs), rule_version)
+
 
 class SummarizerAgent(Agent):
     def summarize(self, matches):
-        score = matches.get('compliance_score', 0)
-        found_docs = matches.get('found_documents', [])
-        missing_docs = matches.get('missing_documents', [])
-        total_required = matches.get('total_required', 0)
-        analysis = matches.get('analysis', '')
-        
-        if score >= 0.8:
-            status = "[APPROVED] YOU CAN PROCEED WITH CONSTRUCTION"
-            recommendation = "All major construction requirements are satisfied."
-        else:
-            status = "[NOT APPROVED] MISSING REQUIRED DOCUMENTS"
-            recommendation = "You need to obtain the missing documents before construction."
-        
-        summary = f"""BUILDING CONSTRUCTION COMPLIANCE REPORT
-        
-        STATUS: {status}
-        Compliance Score: {score:.1%} ({len(found_docs)}/{total_required} documents)
-        
-        DOCUMENTS FOUND:
-        {chr(10).join([f'  - {doc}' for doc in found_docs]) if found_docs else '  - None found'}
-        
-        MISSING DOCUMENTS:
-        {chr(10).join([f'  - {doc}' for doc in missing_docs]) if missing_docs else '  - None missing'}
-        
-        ANALYSIS: {analysis}
-        
-        RECOMMENDATION: {recommendation}
-        
-        NEXT STEPS:
-        {'  - Proceed with construction as all requirements are met!' if score >= 0.8 else '  - Obtain the missing documents listed above'}
-        {'  - Contact local building authority for final approval' if score >= 0.8 else '  - Submit complete documentation for approval'}
-        {'  - Begin construction with proper permits' if score >= 0.8 else '  - Do not start construction until all documents are obtained'}
-        """
-        return summary
\ No newline at end of file
+        """Render the compliance report of a ComplianceResult (or a match dict)"""
+        if not isinstance(matches, ComplianceResult):
+            matches = ComplianceResult.from_dict(matches)
+        with STAGE_SECONDS.labels("summarize").time():
+            return render_report(matches)
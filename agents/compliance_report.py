@@ -0,0 +1,221 @@
+from functools import lru_cache
+from typing import Literal, get_args
+
+# Share of required documents that must be found for approval
+APPROVAL_THRESHOLD = 0.8
+
+# Formats a stored workflow result can be returned in
+ResultFormat = Literal["compact", "full", "report"]
+REPORT_FORMATS = get_args(ResultFormat)
+
+STOPPED_SUMMARY = "Process stopped - Compliance conditions not met"
+STOPPED_REASON = "Compliance score too low"
+
+
+class ComplianceResult:
+    """
+    The outcome of matching one document against one jurisdiction
+
+    Holds only the facts (found and missing documents, counts, rule
+    version); the verdict, analysis line and report are derived from them
+    when asked for. Item access (result["compliance_score"]) and to_dict()
+    give the dict that match_rules used to return.
+    """
+
+    __slots__ = ("found_documents", "missing_documents", "keywords_found", "total_required", "rule_version")
+
+    def __init__(self, found_documents, missing_documents, keywords_found, total_required, rule_version=None):
+        self.found_documents = tuple(found_documents)
+        self.missing_documents = tuple(missing_documents)
+        self.keywords_found = keywords_found
+        self.total_required = total_required
+        self.rule_version = rule_version
+
+    @property
+    def compliance_score(self):
+        found = len(self.found_documents)
+        return (found / self.total_required) if self.total_required > 0 else 0
+
+    @property
+    def should_continue(self):
+        return self.compliance_score >= APPROVAL_THRESHOLD
+
+    @property
+    def verdict(self):
+        return "approved" if self.should_continue else "not_approved"
+
+    @property
+    def analysis(self):
+        return f"Found {len(self.found_documents)}/{self.total_required} required construction documents"
+
+    def __getitem__(self, key):
+        if key not in _DICT_KEYS:
+            raise KeyError(key)
+        value = getattr(self, key)
+        return list(value) if isinstance(value, tuple) else value
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        return {key: self[key] for key in _DICT_KEYS}
+
+    def to_record(self):
+        """The stored form: just the facts, as plain JSON types"""
+        return {
+            "found_documents": list(self.found_documents),
+            "missing_documents": list(self.missing_documents),
+            "keywords_found": self.keywords_found,
+            "total_required": self.total_required,
+            "rule_version": self.rule_version,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build from to_record() output or an old-style match dict"""
+        return cls(
+            data.get("found_documents", ()),
+            data.get("missing_documents", ()),
+            data.get("keywords_found", 0),
+            data.get("total_required", 0),
+            data.get("rule_version"),
+        )
+
+    def compact(self):
+        return {
+            "verdict": self.verdict,
+            "compliance_score": round(self.compliance_score, 4),
+            "missing_documents": list(self.missing_documents),
+        }
+
+
+_DICT_KEYS = (
+    "found_documents", "missing_documents", "compliance_score", "should_continue",
+    "keywords_found", "total_required", "analysis", "rule_version",
+)
+
+
+@lru_cache(maxsize=None)
+def _report_template(approved):
+    # Everything that depends only on the outcome is baked in once per outcome
+    if approved:
+        status = "[APPROVED] YOU CAN PROCEED WITH CONSTRUCTION"
+        recommendation = "All major construction requirements are satisfied."
+        next_steps = (
+            "  - Proceed with construction as all requirements are met!",
+            "  - Contact local building authority for final approval",
+            "  - Begin construction with proper permits",
+        )
+    else:
+        status = "[NOT APPROVED] MISSING REQUIRED DOCUMENTS"
+        recommendation = "You need to obtain the missing documents before construction."
+        next_steps = (
+            "  - Obtain the missing documents listed above",
+            "  - Submit complete documentation for approval",
+            "  - Do not start construction until all documents are obtained",
+        )
+    indent = "\n        "
+    return (
+        "BUILDING CONSTRUCTION COMPLIANCE REPORT" + indent
+        + indent + f"STATUS: {status}"
+        + indent + "Compliance Score: {score:.1%} ({found_count}/{total_required} documents)"
+        + indent
+        + indent + "DOCUMENTS FOUND:"
+        + indent + "{found}"
+        + indent
+        + indent + "MISSING DOCUMENTS:"
+        + indent + "{missing}"
+        + indent
+        + indent + "ANALYSIS: {analysis}"
+        + indent
+        + indent + f"RECOMMENDATION: {recommendation}"
+        + indent
+        + indent + "NEXT STEPS:"
+        + "".join(indent + step for step in next_steps)
+        + indent
+    )
+
+
+def render_report(result):
+    """Render the human-readable report of a ComplianceResult"""
+    found = result.found_documents
+    missing = result.missing_documents
+    return _report_template(result.should_continue).format(
+        score=result.compliance_score,
+        found_count=len(found),
+        total_required=result.total_required,
+        found="\n".join(f"  - {doc}" for doc in found) if found else "  - None found",
+        missing="\n".join(f"  - {doc}" for doc in missing) if missing else "  - None missing",
+        analysis=result.analysis,
+    )
+
+
+class WorkflowResult:
+    """
+    What a workflow run produced: its status, the match result for the
+    deciding jurisdiction and any extras (pages read, other jurisdictions)
+
+    The extracted text is kept only for callers that show it (the
+    dashboards); to_record() leaves it out, so stored jobs stay small.
+    """
+
+    __slots__ = ("status", "result", "extracted", "details")
+
+    def __init__(self, status, result, extracted=None, details=None):
+        self.status = status
+        self.result = result
+        self.extracted = extracted
+        self.details = details or {}
+
+    def to_record(self):
+        record = {"status": self.status, **self.result.to_record()}
+        for key, value in self.details.items():
+            if key == "jurisdictions":
+                value = {name: result.to_record() for name, result in value.items()}
+            record[key] = value
+        return record
+
+    @classmethod
+    def from_record(cls, record):
+        # Jobs stored before results were compact keep their match dict under "matches"
+        result = ComplianceResult.from_dict(record.get("matches") or record)
+        details = {key: record[key] for key in ("pages_read", "extraction_stopped_early", "best_jurisdiction")
+                   if key in record}
+        if "jurisdictions" in record:
+            details["jurisdictions"] = {
+                name: ComplianceResult.from_dict(data) for name, data in record["jurisdictions"].items()
+            }
+        return cls(record["status"], result, record.get("extracted"), details)
+
+    def render(self, format="full", include_text=False):
+        """
+        Return the result as "compact" (verdict and missing documents),
+        "full" (the match details and summary) or "report" (the text report)
+        """
+        if format == "report":
+            return render_report(self.result) if self.status == "completed" else STOPPED_SUMMARY
+        if format == "compact":
+            compact = {"status": self.status, **self.result.compact()}
+            if "best_jurisdiction" in self.details:
+                compact["best_jurisdiction"] = self.details["best_jurisdiction"]
+            return compact
+        if format != "full":
+            raise ValueError(f"Unknown result format {format!r}, expected one of {REPORT_FORMATS}")
+
+        full = {"status": self.status}
+        if include_text:
+            full["extracted"] = self.extracted
+        full["matches"] = self.result.to_dict()
+        if self.status == "completed":
+            full["summary"] = render_report(self.result)
+        else:
+            full["summary"] = STOPPED_SUMMARY
+            full["reason"] = STOPPED_REASON
+        for key, value in self.details.items():
+            if key == "jurisdictions":
+                value = {name: result.to_dict() for name, result in value.items()}
+            full[key] = value
+        return full
@@ -0,0 +1,117 @@
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Tokens are runs of letters and digits; everything else is a word boundary
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Largest number of tokens allowed between the parts of a "a ... b" phrase
+NEAR_WINDOW = 8
+
+_NO_POSITIONS = array("I")
+
+
+def tokenize(text):
+    """Split text into normalized (lowercased, alphanumeric) tokens"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def compile_phrase(phrase):
+    """
+    Turn a rule phrase into the segments DocumentIndex.contains_pattern expects
+
+    "fire safety" must appear as consecutive tokens. "noc ... fire department"
+    means "noc" followed by "fire department" within NEAR_WINDOW tokens.
+    """
+    segments = tuple(tuple(tokenize(part)) for part in phrase.split("..."))
+    return tuple(segment for segment in segments if segment)
+
+
+class DocumentIndex:
+    """
+    A tokenized, normalized index of a document
+
+    Each distinct token maps to an array of the positions where it occurs,
+    so keyword and phrase checks are lookups whose cost depends on how often
+    the terms occur, not on how long the document is. Text can be appended
+    page by page; positions continue across calls, so phrases spanning a
+    page break still match.
+    """
+
+    __slots__ = ("_postings", "token_count")
+
+    def __init__(self, text=""):
+        self._postings = {}
+        self.token_count = 0
+        if text:
+            self.add_text(text)
+
+    def add_text(self, text):
+        """Append text to the index"""
+        postings = self._postings
+        position = self.token_count
+        for token in tokenize(text):
+            positions = postings.get(token)
+            if positions is None:
+                positions = postings[token] = array("I")
+            positions.append(position)
+            position += 1
+        self.token_count = position
+
+    def __contains__(self, token):
+        return token in self._postings
+
+    def __len__(self):
+        return len(self._postings)
+
+    def positions(self, token):
+        return self._postings.get(token, _NO_POSITIONS)
+
+    def _occurs_at(self, token, position):
+        positions = self._postings.get(token, _NO_POSITIONS)
+        i = bisect_left(positions, position)
+        return i < len(positions) and positions[i] == position
+
+    def phrase_starts(self, tokens):
+        """Return the sorted start positions of a run of consecutive tokens"""
+        if not tokens:
+            return []
+        # Anchor on the rarest token and verify its neighbours around it
+        anchor = min(range(len(tokens)), key=lambda i: len(self.positions(tokens[i])))
+        starts = []
+        for position in self.positions(tokens[anchor]):
+            start = position - anchor
+            if start < 0:
+                continue
+            if all(self._occurs_at(token, start + i) for i, token in enumerate(tokens) if i != anchor):
+                starts.append(start)
+        return starts
+
+    def contains_phrase(self, tokens):
+        return bool(self.phrase_starts(tokens))
+
+    def contains_pattern(self, segments, max_gap=NEAR_WINDOW):
+        """
+        Check for segments appearing in order, each within max_gap tokens of
+        the end of the previous one
+
+        Args:
+            segments: Output of compile_phrase
+        """
+        if not segments:
+            return False
+        if len(segments) == 1:
+            return self.contains_phrase(segments[0])
+
+        ends = [start + len(segments[0]) for start in self.phrase_starts(segments[0])]
+        for segment in segments[1:]:
+            next_ends = []
+            for start in self.phrase_starts(segment):
+                # Any previous segment ending in [start - max_gap, start] will do
+                lo = bisect_left(ends, start - max_gap)
+                if lo < bisect_right(ends, start):
+                    next_ends.append(start + len(segment))
+            if not next_ends:
+                return False
+            ends = next_ends
+        return True
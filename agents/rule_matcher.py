@@ -0,0 +1,111 @@
+import time
+from agents.document_index import DocumentIndex, compile_phrase
+
+
+class CompiledRuleSet:
+    """
+    One jurisdiction's keywords and required documents, compiled for matching
+
+    Keywords and document phrases are pre-tokenized, so matching a document
+    is a handful of lookups in its DocumentIndex with proper word
+    boundaries ("far" no longer matches "farm").
+
+    Required documents are either a title string, matched as a whole
+    phrase, or {"name": title, "match": [phrase, ...]}, found when any of
+    the phrases occurs. See compile_phrase for the phrase syntax.
+    """
+
+    def __init__(self, keywords, required_docs):
+        self.keywords = tuple(keywords)
+        self._keyword_patterns = tuple(compile_phrase(keyword) for keyword in self.keywords)
+
+        names = []
+        doc_patterns = []
+        for doc in required_docs:
+            if isinstance(doc, str):
+                name, phrases = doc, [doc]
+            else:
+                name, phrases = doc["name"], doc.get("match") or [doc["name"]]
+            names.append(name)
+            doc_patterns.append(tuple(compile_phrase(phrase) for phrase in phrases))
+        self.required_docs = tuple(names)
+        self._doc_patterns = tuple(doc_patterns)
+
+    def match(self, document):
+        """
+        Match a document against the rule set
+
+        Args:
+            document: A DocumentIndex, or text to index first
+
+        Returns:
+            (keyword_count, found_docs, missing_docs)
+        """
+        index = document if isinstance(document, DocumentIndex) else DocumentIndex(document)
+        keyword_count = self.count_keywords(index)
+        found_docs = []
+        missing_docs = []
+        for doc, patterns in zip(self.required_docs, self._doc_patterns):
+            if self._contains_any(index, patterns):
+                found_docs.append(doc)
+            else:
+                missing_docs.append(doc)
+        return keyword_count, found_docs, missing_docs
+
+    @staticmethod
+    def _contains_any(index, patterns):
+        return any(index.contains_pattern(pattern) for pattern in patterns)
+
+    def count_keywords(self, index):
+        return sum(1 for pattern in self._keyword_patterns if index.contains_pattern(pattern))
+
+
+class IncrementalMatch:
+    """
+    A match of a rule set against a DocumentIndex that grows page by page
+
+    A document stays found once the index holds it, so update() checks
+    only the documents still missing; keywords only feed the result, so
+    they are counted once, in result(). seconds is the time spent
+    matching across every call.
+    """
+
+    __slots__ = ("rules", "rule_version", "seconds", "_missing")
+
+    def __init__(self, rules, rule_version=None):
+        self.rules = rules
+        self.rule_version = rule_version
+        self.seconds = 0.0
+        self._missing = list(range(len(rules.required_docs)))
+
+    @property
+    def total(self):
+        return len(self.rules.required_docs)
+
+    @property
+    def missing_count(self):
+        return len(self._missing)
+
+    @property
+    def found_count(self):
+        return self.total - len(self._missing)
+
+    def update(self, index):
+        """Re-check the still-missing documents against the grown index"""
+        started = time.perf_counter()
+        patterns = self.rules._doc_patterns
+        self._missing = [i for i in self._missing if not self.rules._contains_any(index, patterns[i])]
+        self.seconds += time.perf_counter() - started
+
+    def result(self, index):
+        """
+        Returns:
+            (keyword_count, found_docs, missing_docs), like CompiledRuleSet.match
+        """
+        started = time.perf_counter()
+        keyword_count = self.rules.count_keywords(index)
+        missing = set(self._missing)
+        found_docs = [doc for i, doc in enumerate(self.rules.required_docs) if i not in missing]
+        missing_docs = [self.rules.required_docs[i] for i in self._missing]
+        self.seconds += time.perf_counter() - started
+        return keyword_count, found_docs, missing_docs
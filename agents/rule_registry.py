@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import threading
+from logging_config import get_logger
+from agents.rule_matcher import CompiledRuleSet
+
+logger = get_logger(__name__)
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rules")
+RULES_PATH = os.getenv("COMPLIANCE_RULES_PATH", DEFAULT_RULES_PATH)
+# Seconds between background checks of the rules files for changes; 0 turns reloading off
+RULES_RELOAD_INTERVAL = float(os.getenv("COMPLIANCE_RULES_RELOAD_INTERVAL", 5))
+
+EMPTY_RULES = CompiledRuleSet([], [])
+
+
+class RuleSnapshot:
+    """
+    An immutable, compiled view of every jurisdiction's rules
+
+    A match holds on to the snapshot it started with, so a reload that
+    lands mid-match never mixes rules from two versions.
+    """
+
+    def __init__(self, version, jurisdictions):
+        self.version = version
+        self.jurisdictions = jurisdictions
+
+    def get(self, jurisdiction):
+        return self.jurisdictions.get(jurisdiction, EMPTY_RULES)
+
+
+class RuleRegistry:
+    """
+    Jurisdiction rules loaded from a JSON file or a directory of JSON files
+
+    Each file looks like {"version": "...", "jurisdictions": {name: {
+    "keywords": [...], "required_docs": [...]}}}; see CompiledRuleSet for
+    the required_docs entry format. The snapshot version is the
+    declared version(s) plus a hash of the file contents, so an edit that
+    forgets to bump the version still produces a new version string.
+    """
+
+    def __init__(self, path=RULES_PATH, reload_interval=RULES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._watcher_lock = threading.Lock()
+        self._watcher_pid = None
+        self._stopped = threading.Event()
+        self._fingerprint = self._files_fingerprint()
+        self._snapshot = self.load()
+
+    def _rule_files(self):
+        if os.path.isdir(self.path):
+            return sorted(
+                os.path.join(self.path, name)
+                for name in os.listdir(self.path)
+                if name.endswith(".json")
+            )
+        return [self.path]
+
+    def _files_fingerprint(self):
+        fingerprint = []
+        for path in self._rule_files():
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(fingerprint)
+
+    def load(self):
+        """Read and compile the rules files into a new snapshot"""
+        declared_versions = []
+        digest = hashlib.sha256()
+        jurisdictions = {}
+        for path in self._rule_files():
+            with open(path, "rb") as f:
+                raw = f.read()
+            digest.update(raw)
+            document = json.loads(raw)
+            declared_versions.append(str(document.get("version", "0")))
+            for name, rules in document["jurisdictions"].items():
+                if name in jurisdictions:
+                    raise ValueError(f"Jurisdiction {name} is defined in more than one rules file")
+                jurisdictions[name] = CompiledRuleSet(rules["keywords"], rules["required_docs"])
+
+        version = f"{'/'.join(declared_versions)}+{digest.hexdigest()[:8]}"
+        logger.info(f"Loaded compliance rules version {version} for {len(jurisdictions)} jurisdictions")
+        return RuleSnapshot(version, jurisdictions)
+
+    def reload(self):
+        """
+        Recompile the rules and swap them in atomically
+
+        The new snapshot is built before the swap, so in-flight matches keep
+        using the old one undisturbed. If the files fail to parse, the
+        current snapshot stays in place.
+        """
+        with self._reload_lock:
+            try:
+                # Remember the files we tried, so a broken edit is reported once
+                # rather than on every check until it is fixed
+                self._fingerprint = self._files_fingerprint()
+                snapshot = self.load()
+            except Exception as e:
+                logger.error(f"Failed to reload compliance rules from {self.path}: {str(e)}", exc_info=True)
+                return self._snapshot
+            self._snapshot = snapshot
+            return snapshot
+
+    def check(self):
+        """Reload if the rules files changed since the last load; returns whether they had"""
+        try:
+            changed = self._files_fingerprint() != self._fingerprint
+        except OSError:
+            # A file vanished mid-listing; look again on the next check
+            return False
+        if changed:
+            self.reload()
+        return changed
+
+    def _watch(self):
+        while not self._stopped.wait(self.reload_interval):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Error checking compliance rules for changes: {str(e)}", exc_info=True)
+
+    def _ensure_watcher(self):
+        # Threads do not survive a fork, so each worker process starts its own
+        if self.reload_interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        with self._watcher_lock:
+            if self._watcher_pid != os.getpid():
+                # The parent's reload lock may have been held at the fork
+                self._reload_lock = threading.Lock()
+                self._watcher_pid = os.getpid()
+                threading.Thread(target=self._watch, name="rules-reloader", daemon=True).start()
+
+    def snapshot(self):
+        """
+        Return the current rules
+
+        Edits to the files are picked up by a background thread every
+        reload_interval seconds, so no match pays for a recompile.
+        """
+        self._ensure_watcher()
+        return self._snapshot
+
+    def stop(self):
+        """Stop watching the rules files"""
+        self._stopped.set()
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_rule_registry():
+    """Return the process-wide rule registry, loading it on first use"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = RuleRegistry()
+        return _registry
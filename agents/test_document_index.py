@@ -0,0 +1,38 @@
+from agents.document_index import DocumentIndex, compile_phrase, tokenize
+
+
+def test_tokenize_lowercases_and_splits_on_punctuation():
+    assert tokenize("Fire-NOC, issued 2024.") == ["fire", "noc", "issued", "2024"]
+
+
+def test_keywords_match_whole_words_only():
+    index = DocumentIndex("The farm is far from the firehouse")
+
+    assert index.contains_pattern(compile_phrase("far"))
+    assert index.contains_pattern(compile_phrase("farm"))
+    assert not index.contains_pattern(compile_phrase("fa"))
+    assert not index.contains_pattern(compile_phrase("fire"))
+
+
+def test_phrases_need_consecutive_tokens():
+    index = DocumentIndex("Fire safety certificate. Safety of fire exits")
+
+    assert index.contains_pattern(compile_phrase("fire safety"))
+    assert index.contains_pattern(compile_phrase("safety of fire"))
+    assert not index.contains_pattern(compile_phrase("fire certificate"))
+
+
+def test_near_operator_allows_a_bounded_gap():
+    index = DocumentIndex("NOC obtained from the local fire department")
+
+    assert index.contains_pattern(compile_phrase("noc ... fire department"))
+    assert not index.contains_pattern(compile_phrase("fire department ... noc"))
+    assert not index.contains_pattern(compile_phrase("noc ... fire department"), max_gap=2)
+
+
+def test_phrases_span_appended_pages():
+    index = DocumentIndex("page one ends with building")
+    index.add_text("permit on page two")
+
+    assert index.contains_pattern(compile_phrase("building permit"))
+    assert index.token_count == 9
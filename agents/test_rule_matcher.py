@@ -0,0 +1,44 @@
+from agents.document_index import DocumentIndex
+from agents.rule_matcher import CompiledRuleSet, IncrementalMatch
+
+RULES = CompiledRuleSet(
+    keywords=["permit", "fire safety", "far"],
+    required_docs=[
+        "Building Permit",
+        {"name": "Fire NOC", "match": ["fire noc", "noc ... fire department"]},
+        "Site Plan",
+    ],
+)
+
+
+def test_match_uses_word_boundaries():
+    keyword_count, found, missing = RULES.match("Building permits were filed on the farm")
+
+    # "permits" and "farm" are different words from "permit" and "far"
+    assert keyword_count == 0
+    assert found == []
+    assert missing == ["Building Permit", "Fire NOC", "Site Plan"]
+
+
+def test_match_finds_titles_and_alternative_phrases():
+    keyword_count, found, missing = RULES.match(
+        "Building permit granted. NOC issued by the fire department after a fire safety audit."
+    )
+
+    assert keyword_count == 2
+    assert found == ["Building Permit", "Fire NOC"]
+    assert missing == ["Site Plan"]
+
+
+def test_incremental_match_agrees_with_full_match():
+    pages = ["Building permit granted.", "NOC from the", "fire department.", "Site plan attached; far from done."]
+    index = DocumentIndex()
+    match = IncrementalMatch(RULES)
+    missing_counts = []
+    for page in pages:
+        index.add_text(page)
+        match.update(index)
+        missing_counts.append(match.missing_count)
+
+    assert missing_counts == [2, 2, 1, 0]
+    assert match.result(index) == RULES.match(" ".join(pages))
@@ -0,0 +1,397 @@
+"""
+Benchmarks for the compliance pipeline
+
+Generates a synthetic corpus of permit PDFs and measures latency,
+throughput and peak memory of each stage: parse_document, match_rules,
+summarize and the whole run_workflow (with a cold and a warm extraction
+cache). Results are written as JSON and can be compared with a stored
+baseline; the comparison exits non-zero when a stage regressed.
+
+    python benchmark.py --documents 20 --pages 30 --output bench.json
+    python benchmark.py --baseline benchmarks/baseline.json
+
+The corpus is generated from a seed and the rules, so the same options
+produce the same documents. Compare only results from the same machine.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Words between the permit phrases; a realistic mix of lengths
+FILLER_WORDS = (
+    "the", "site", "plan", "shows", "proposed", "works", "to", "a", "two", "storey",
+    "residential", "extension", "with", "rear", "access", "and", "drainage", "layout",
+    "submitted", "by", "applicant", "including", "elevations", "sections", "details",
+    "of", "materials", "roof", "timber", "frame", "foundations", "boundary", "wall",
+    "ground", "floor", "area", "square", "metres", "height", "ridge", "neighbouring",
+    "property", "schedule", "annex", "reference", "drawing", "revision", "dated",
+)
+LINE_CHARACTERS = 90
+LINES_PER_PAGE = 60
+
+# Stages whose p50/p95 latency or peak memory is compared against the baseline
+DEFAULT_TOLERANCE = 0.15
+DEFAULT_MEMORY_TOLERANCE = 0.25
+# Changes smaller than these are timer and allocator noise, whatever the ratio
+NOISE_FLOOR = {"p50_ms": 0.05, "p95_ms": 0.05, "peak_memory_kb": 64}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Synthetic corpus
+# ─────────────────────────────────────────────────────────────────────────────
+def _pdf_string(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(pages):
+    """Return the bytes of a minimal PDF with one page per list of text lines"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    font_id = 3 + 2 * len(pages)
+    for i, lines in enumerate(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode()
+        )
+        shown = " T* ".join(f"({_pdf_string(line)}) Tj" for line in lines)
+        stream = f"BT /F1 9 Tf 12 TL 40 760 Td {shown} ET".encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def load_rules(path=None):
+    """Read the raw jurisdiction rules the corpus is written against"""
+    from agents.rule_registry import RULES_PATH
+    path = path or RULES_PATH
+    files = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".json")] \
+        if os.path.isdir(path) else [path]
+    rules = {}
+    for file in files:
+        with open(file) as f:
+            rules.update(json.load(f).get("jurisdictions", {}))
+    return rules
+
+
+def _parse_mix(spec):
+    mix = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, weight = item.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def _document_phrases(rules):
+    # One phrase per required document; "a ... b" patterns are written out as "a b"
+    phrases = []
+    for doc in rules.get("required_docs", []):
+        phrase = doc if isinstance(doc, str) else (doc.get("match") or [doc["name"]])[0]
+        phrases.append(phrase.replace(" ... ", " "))
+    return phrases
+
+
+def _page_lines(rng, words_per_page, phrases):
+    words = [rng.choice(FILLER_WORDS) for _ in range(words_per_page)]
+    for phrase in phrases:
+        words.insert(rng.randrange(len(words) + 1), phrase)
+    lines, line = [], ""
+    for word in words:
+        if line and len(line) + len(word) + 1 > LINE_CHARACTERS:
+            lines.append(line)
+            line = word
+        else:
+            line = f"{line} {word}" if line else word
+        if len(lines) == LINES_PER_PAGE:
+            break
+    if line and len(lines) < LINES_PER_PAGE:
+        lines.append(line)
+    return lines
+
+
+def generate_corpus(directory, rules, documents=10, pages=20, words_per_page=400,
+                    mix="EU=1,UK=1,India=1", coverage=0.7, seed=1):
+    """
+    Write synthetic permit PDFs and return their descriptions
+
+    Each document belongs to a jurisdiction drawn from the weighted mix
+    and mentions each of that jurisdiction's required documents with
+    probability `coverage`, on a random page, so the corpus has both
+    approved and stopped documents.
+
+    Returns:
+        list of {"path", "jurisdiction", "pages", "bytes"} dicts
+    """
+    rng = random.Random(seed)
+    weights = {name: weight for name, weight in _parse_mix(mix).items() if name in rules}
+    if not weights:
+        raise ValueError(f"No jurisdiction of mix {mix!r} is in the rules")
+    names, cumulative = list(weights), list(weights.values())
+
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    for number in range(documents):
+        jurisdiction = rng.choices(names, cumulative)[0]
+        page_phrases = [[] for _ in range(pages)]
+        for phrase in _document_phrases(rules[jurisdiction]) + list(rules[jurisdiction].get("keywords", [])):
+            if rng.random() < coverage:
+                page_phrases[rng.randrange(pages)].append(phrase)
+        data = build_pdf([_page_lines(rng, words_per_page, phrases) for phrases in page_phrases])
+        path = os.path.join(directory, f"permit-{number:04d}-{jurisdiction}.pdf")
+        with open(path, "wb") as f:
+            f.write(data)
+        corpus.append({"path": path, "jurisdiction": jurisdiction, "pages": pages, "bytes": len(data)})
+    return corpus
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Measurement
+# ─────────────────────────────────────────────────────────────────────────────
+def _percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def _summarize_samples(samples, pages, nbytes):
+    total = sum(samples)
+    return {
+        "runs": len(samples),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(_percentile(samples, 0.50) * 1000, 3),
+        "p95_ms": round(_percentile(samples, 0.95) * 1000, 3),
+        "min_ms": round(min(samples) * 1000, 3),
+        "docs_per_sec": round(len(samples) / total, 2) if total else None,
+        "pages_per_sec": round(pages / total, 2) if total else None,
+        "mb_per_sec": round(nbytes / total / 1e6, 3) if total else None,
+    }
+
+
+def _time_stage(calls, repeat, warmup):
+    """
+    Run every (fn, pages, nbytes) call repeat times, after warmup runs
+
+    Timing and memory are measured in separate passes, since tracemalloc
+    slows allocation-heavy code severalfold.
+    """
+    for fn, _, _ in calls[:warmup]:
+        fn()
+    samples, pages, nbytes = [], 0, 0
+    for _ in range(repeat):
+        for fn, call_pages, call_bytes in calls:
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+            pages += call_pages
+            nbytes += call_bytes
+    result = _summarize_samples(samples, pages, nbytes)
+
+    peak = 0
+    for fn, _, _ in calls:
+        tracemalloc.start()
+        try:
+            fn()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    result["peak_memory_kb"] = round(peak / 1024, 1)
+    return result
+
+
+def run_benchmarks(corpus, repeat=3, warmup=1, extract_workers=1):
+    """
+    Measure each pipeline stage over the corpus
+
+    extract_workers is passed to parse_document; the default of 1 keeps
+    extraction in this process so its memory is counted and runs are
+    comparable across machines with different core counts.
+    """
+    # Keep the workflow's extraction cache out of the real cache directory
+    cache_directory = tempfile.mkdtemp(prefix="bench-cache-")
+    os.environ["EXTRACTION_CACHE_DIR"] = cache_directory
+    from agents.compliance_agents import ExtractorAgent, MatcherAgent, SummarizerAgent
+    from conditional_workflow import BuildingComplianceWorkflow
+    import extraction_cache
+
+    extractor = ExtractorAgent(role="Benchmark Extractor", goal="Parse documents", backstory="Benchmark")
+    matcher = MatcherAgent(role="Benchmark Matcher", goal="Match rules", backstory="Benchmark")
+    summarizer = SummarizerAgent(role="Benchmark Summarizer", goal="Summarize", backstory="Benchmark")
+    workflow = BuildingComplianceWorkflow()
+
+    texts = [extractor.parse_document(doc["path"], workers=extract_workers) for doc in corpus]
+    indexes = [extractor.index_document(text) for text in texts]
+    matches = [matcher.match_rules(index, doc["jurisdiction"]) for index, doc in zip(indexes, corpus)]
+
+    stages = {}
+    stages["parse_document"] = _time_stage([
+        (lambda doc=doc: extractor.parse_document(doc["path"], workers=extract_workers), doc["pages"], doc["bytes"])
+        for doc in corpus
+    ], repeat, warmup)
+    stages["match_rules"] = _time_stage([
+        (lambda text=text, doc=doc: matcher.match_rules(extractor.index_document(text), doc["jurisdiction"]),
+         doc["pages"], len(text))
+        for text, doc in zip(texts, corpus)
+    ], repeat, warmup)
+    stages["summarize"] = _time_stage([
+        (lambda match=match: summarizer.summarize(match), 0, 0) for match in matches
+    ], repeat, warmup)
+
+    # Cold: every run starts from an empty extraction cache
+    def cold_run(doc):
+        extraction_cache._cache = extraction_cache.ExtractionCache(tempfile.mkdtemp(dir=cache_directory))
+        workflow.run_workflow(doc["path"], doc["jurisdiction"])
+
+    workflow_calls = [(lambda doc=doc: cold_run(doc), doc["pages"], doc["bytes"]) for doc in corpus]
+    stages["run_workflow_cold"] = _time_stage(workflow_calls, repeat, warmup)
+    extraction_cache._cache = extraction_cache.ExtractionCache(os.path.join(cache_directory, "warm"))
+    stages["run_workflow_warm"] = _time_stage([
+        (lambda doc=doc: workflow.run_workflow(doc["path"], doc["jurisdiction"]), doc["pages"], doc["bytes"])
+        for doc in corpus
+    ], repeat, warmup=len(corpus))
+
+    approved = sum(1 for match in matches if match.get("should_continue"))
+    return stages, {"approved": approved, "stopped": len(matches) - approved}
+
+
+def _environment():
+    from agents.compliance_agents import EXTRACTOR_VERSION
+    from agents.rule_registry import get_rule_registry
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "extractor_version": EXTRACTOR_VERSION,
+        "rules_version": get_rule_registry().snapshot().version,
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Baseline comparison
+# ─────────────────────────────────────────────────────────────────────────────
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, memory_tolerance=DEFAULT_MEMORY_TOLERANCE):
+    """
+    Compare results with a baseline run
+
+    A stage regressed when its p50 or p95 latency grew by more than
+    tolerance, or its peak memory by more than memory_tolerance, and by
+    more than the metric's NOISE_FLOOR in absolute terms.
+
+    Returns:
+        (rows, regressions): one row per compared metric, and the rows
+        that regressed
+    """
+    if results["corpus"] != baseline.get("corpus"):
+        print("Warning: the baseline was measured on a different corpus, so the comparison is indicative only")
+    rows, regressions = [], []
+    for stage, measured in results["stages"].items():
+        reference = baseline.get("stages", {}).get(stage)
+        if reference is None:
+            continue
+        for metric, allowed in (("p50_ms", tolerance), ("p95_ms", tolerance), ("peak_memory_kb", memory_tolerance)):
+            before, after = reference.get(metric), measured.get(metric)
+            if not before or after is None:
+                continue
+            change = after / before - 1
+            row = {"stage": stage, "metric": metric, "baseline": before, "current": after,
+                   "change": round(change, 4),
+                   "regressed": change > allowed and after - before > NOISE_FLOOR[metric]}
+            rows.append(row)
+            if row["regressed"]:
+                regressions.append(row)
+    return rows, regressions
+
+
+def print_results(results, rows=None):
+    print(f"{'stage':<20}{'p50 ms':>10}{'p95 ms':>10}{'docs/s':>9}{'pages/s':>10}{'peak KB':>11}")
+    for stage, measured in results["stages"].items():
+        print(
+            f"{stage:<20}{measured['p50_ms']:>10.2f}{measured['p95_ms']:>10.2f}"
+            f"{measured['docs_per_sec'] or 0:>9.1f}{measured['pages_per_sec'] or 0:>10.1f}"
+            f"{measured['peak_memory_kb']:>11.1f}"
+        )
+    if rows:
+        print(f"\n{'stage':<20}{'metric':<16}{'baseline':>11}{'current':>11}{'change':>9}")
+        for row in rows:
+            flag = "  REGRESSED" if row["regressed"] else ""
+            print(
+                f"{row['stage']:<20}{row['metric']:<16}{row['baseline']:>11.2f}"
+                f"{row['current']:>11.2f}{row['change']:>+9.1%}{flag}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the compliance pipeline on a synthetic corpus")
+    parser.add_argument("--documents", type=int, default=10, help="documents in the corpus")
+    parser.add_argument("--pages", type=int, default=20, help="pages per document")
+    parser.add_argument("--density", type=int, default=400, help="filler words per page")
+    parser.add_argument("--mix", default="EU=1,UK=1,India=1", help="weighted jurisdiction mix")
+    parser.add_argument("--coverage", type=float, default=0.7, help="chance each required document is mentioned")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the corpus")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before each stage")
+    parser.add_argument("--extract-workers", type=int, default=1)
+    parser.add_argument("--corpus-dir", help="keep the generated PDFs here (default: a temp directory)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare with this results file; exits 1 on a regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    rules = load_rules()
+    corpus_params = {
+        "documents": args.documents, "pages": args.pages, "words_per_page": args.density,
+        "mix": args.mix, "coverage": args.coverage, "seed": args.seed,
+    }
+    corpus_dir = args.corpus_dir or tempfile.mkdtemp(prefix="bench-corpus-")
+    corpus = generate_corpus(corpus_dir, rules, **corpus_params)
+
+    stages, outcomes = run_benchmarks(corpus, args.repeat, args.warmup, args.extract_workers)
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": _environment(),
+        "corpus": {**corpus_params, **outcomes, "bytes": sum(doc["bytes"] for doc in corpus)},
+        "settings": {"repeat": args.repeat, "warmup": args.warmup, "extract_workers": args.extract_workers},
+        "stages": stages,
+    }
+
+    rows = regressions = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows, regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+        results["comparison"] = {"baseline": args.baseline, "regressions": regressions}
+
+    print_results(results, rows)
+    if args.output:
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond tolerance")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
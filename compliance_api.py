@@ -1,62 +1,373 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import os
 import uuid
-from conditional_workflow import ConditionalComplianceWorkflow
+from datetime import date
+from agents.compliance_report import ResultFormat, WorkflowResult
+from conditional_workflow import get_workflow_pool
+from job_store import SQLiteJobStore
+from logging_config import get_logger
+from metrics import REGISTRY, JOBS, STAGE_SECONDS, Gauge
+from outcome_store import OutcomeStore
+from work_queue import PURGE_INTERVAL, WorkQueue, make_worker_id
+
+logger = get_logger(__name__)
 
 app = FastAPI()
 
-# In-memory job storage
-jobs = {}
+# Jobs and the work queue live in SQLite files that every API and worker
+# process shares, so work submitted to one process can run on any other
+COMPLIANCE_JOB_STORE_PATH = os.getenv("COMPLIANCE_JOB_STORE_PATH", os.path.join("data", "compliance_jobs.db"))
+COMPLIANCE_QUEUE_PATH = os.getenv("COMPLIANCE_QUEUE_PATH", os.path.join("data", "compliance_queue.db"))
+jobs = SQLiteJobStore(COMPLIANCE_JOB_STORE_PATH)
+# Every finished job's outcome as a bitset, for /analytics (see outcome_store.py)
+outcomes = OutcomeStore()
+
+def task_exhausted(task_id: str, kind: str, payload: dict) -> None:
+    # The task's lease expired WORK_MAX_ATTEMPTS times, e.g. its worker process kept dying
+    job = jobs.get(task_id)
+    if job is not None and job["status"] in ("queued", "processing"):
+        jobs.update(task_id, status="failed", error="The job was interrupted too many times")
+        JOBS.labels("failed").inc()
+
+work_queue = WorkQueue(COMPLIANCE_QUEUE_PATH, on_exhausted=task_exhausted)
+worker_id = make_worker_id()
+# Single jobs and batch items are queued apart; workers take single jobs
+# first, so one submitted after a large batch does not wait behind it
+TASK_KIND = "compliance"
+BATCH_TASK_KIND = "compliance_batch"
+
+# Workflows run on a bounded pool of worker processes, fed by the work queue
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", os.cpu_count() or 1))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 10000))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", BATCH_WORKERS))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", 1000))
+# Batch items pending; never below MAX_BATCH_SIZE, so any accepted batch fits once the queue drains
+BATCH_QUEUE_SIZE = max(int(os.getenv("BATCH_QUEUE_SIZE", 5 * MAX_BATCH_SIZE)), MAX_BATCH_SIZE)
+# Set to false for API-only processes that leave the work to `run_compliance_api.py worker`
+RUN_JOB_WORKERS = os.getenv("RUN_JOB_WORKERS", "true").lower() == "true"
+# How long an idle worker waits before polling the queue again
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", 0.5))
+_process_pool = None
+_job_worker_tasks = []
+
+QUEUE_DEPTH = Gauge("compliance_queue_depth", "Compliance jobs waiting in the shared queue", ["kind"])
+QUEUE_DEPTH.labels(TASK_KIND).set_function(lambda: work_queue.count(TASK_KIND))
+QUEUE_DEPTH.labels(BATCH_TASK_KIND).set_function(lambda: work_queue.count(BATCH_TASK_KIND))
+JOBS_IN_FLIGHT = Gauge("compliance_jobs_in_flight", "Compliance jobs this process is running")
 
 class JobRequest(BaseModel):
     project_type: str
     jurisdiction: str
     document: str
+    # Match page by page and stop reading once the outcome is known;
+    # unset means the PIPELINED_EXTRACTION and STOP_WHEN_SETTLED defaults
+    pipelined: bool | None = None
+    stop_when_settled: bool | None = None
+
+class BatchRequest(BaseModel):
+    items: list[JobRequest]
 
 def check_payment() -> bool:
     # Simulate payment check - always returns True for now
     return True
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Workflow execution
+# ─────────────────────────────────────────────────────────────────────────────
+def _warm_worker() -> None:
+    # Runs once in each worker process as it starts; it only ever runs one item at a time.
+    # Drop any metrics inherited from the parent on fork so they are not counted twice
+    REGISTRY.drain()
+    get_workflow_pool().prefill(1)
+
+def _run_compliance_item(document: str, jurisdiction: str, pipelined=None, stop_when_settled=None) -> tuple:
+    # Runs in a worker process, on that process's prebuilt workflow. Only
+    # the compact record goes back (no extracted text, no rendered report),
+    # along with the metrics recorded, since only the parent serves /metrics
+    with get_workflow_pool().instance() as workflow:
+        result = workflow.run_workflow(document, jurisdiction, pipelined=pipelined, stop_when_settled=stop_when_settled)
+    return result.to_record(), REGISTRY.drain()
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=BATCH_WORKERS, initializer=_warm_worker)
+    return _process_pool
+
+async def keep_leases() -> None:
+    """ Renews the leases on every task this process is running """
+    while True:
+        await asyncio.sleep(work_queue.lease_seconds / 3)
+        try:
+            work_queue.renew_all(worker_id)
+        except Exception as e:
+            logger.error(f"Error renewing task leases: {str(e)}", exc_info=True)
+
+async def purge_finished_tasks() -> None:
+    """ Periodically deletes old done and failed tasks and expired jobs, so neither store grows without bound """
+    while True:
+        await asyncio.sleep(PURGE_INTERVAL)
+        try:
+            purged = work_queue.purge_finished()
+            if purged:
+                logger.info(f"Purged {purged} finished tasks from the work queue")
+            evicted = jobs.evict_expired()
+            if evicted:
+                logger.info(f"Evicted {evicted} expired jobs")
+        except Exception as e:
+            logger.error(f"Error purging finished tasks and jobs: {str(e)}", exc_info=True)
+
+async def run_task(task_id: str, payload: dict) -> None:
+    """ Runs one claimed workflow and records the outcome """
+    loop = asyncio.get_running_loop()
+    JOBS_IN_FLIGHT.inc()
+    try:
+        jobs.update(task_id, status="processing", worker=worker_id)
+        with STAGE_SECONDS.labels("workflow").time():
+            result, worker_metrics = await loop.run_in_executor(
+                get_process_pool(), _run_compliance_item, payload["document"], payload["jurisdiction"],
+                payload.get("pipelined"), payload.get("stop_when_settled")
+            )
+        REGISTRY.merge(worker_metrics)
+        jobs.update(task_id, status=result["status"], result=result)
+        JOBS.labels(result["status"]).inc()
+        work_queue.complete(task_id, worker_id)
+        record_outcome(task_id, payload["jurisdiction"], result)
+    except Exception as e:
+        logger.error(f"Compliance job {task_id} failed: {str(e)}", exc_info=True)
+        jobs.update(task_id, status="failed", error=str(e))
+        JOBS.labels("failed").inc()
+        work_queue.fail(task_id, worker_id, str(e))
+    finally:
+        JOBS_IN_FLIGHT.dec()
+
+def record_outcome(task_id: str, jurisdiction: str, result: dict) -> None:
+    try:
+        outcomes.record_job(task_id, {"jurisdiction": jurisdiction, "result": result})
+    except Exception as e:
+        # Analytics are best effort; the job itself has finished
+        logger.error(f"Could not record the outcome of job {task_id}: {str(e)}", exc_info=True)
+
+def backfill_outcomes() -> int:
+    """ Records the outcomes of finished jobs not yet in the outcome store; returns how many """
+    count = 0
+    for status in ("completed", "stopped_at_matching"):
+        for job_id, job in jobs.list_by_status(status, limit=10_000_000):
+            if outcomes.record_job(job_id, job, finished_at=job.get("finished_at") or job["updated_at"]):
+                count += 1
+    return count
+
+async def job_worker() -> None:
+    """ Claims queued jobs from the shared queue, one at a time """
+    while True:
+        try:
+            claimed = work_queue.claim(worker_id, (TASK_KIND, BATCH_TASK_KIND))
+        except Exception as e:
+            logger.error(f"Error claiming a job: {str(e)}", exc_info=True)
+            claimed = None
+        if claimed is None:
+            await asyncio.sleep(WORKER_POLL_INTERVAL)
+            continue
+        await run_task(*claimed)
+
+def start_workers() -> list:
+    # Start the worker processes now so their workflows are built before the first job
+    pool = get_process_pool()
+    for _ in range(BATCH_WORKERS):
+        pool.submit(_warm_worker)
+    tasks = [asyncio.create_task(keep_leases()), asyncio.create_task(purge_finished_tasks())]
+    tasks += [asyncio.create_task(job_worker()) for _ in range(JOB_WORKERS)]
+    _job_worker_tasks.extend(tasks)
+    return tasks
+
+async def run_workers() -> None:
+    """ Runs the job workers without the HTTP API """
+    logger.info(f"Compliance worker {worker_id} started with {JOB_WORKERS} workers")
+    try:
+        await asyncio.gather(*start_workers())
+    finally:
+        shutdown_workers()
+
+@app.on_event("startup")
+async def start_job_workers():
+    if RUN_JOB_WORKERS:
+        start_workers()
+
+def render_result(record, format: ResultFormat):
+    # Stored results are compact records; reports are rendered per request
+    if record is None:
+        return None
+    return WorkflowResult.from_record(record).render(format)
+
+def task_payload(request: JobRequest) -> dict:
+    return {
+        "document": request.document,
+        "jurisdiction": request.jurisdiction,
+        "pipelined": request.pipelined,
+        "stop_when_settled": request.stop_when_settled,
+    }
+
+def queue_is_full(kind: str, extra: int = 1, limit: int = JOB_QUEUE_SIZE) -> bool:
+    return work_queue.count(kind) + extra > limit
+
 @app.post("/start_job")
 async def start_job(request: JobRequest):
     job_id = str(uuid.uuid4())
     
-    # Store initial job
-    jobs[job_id] = {
-        "status": "payment_pending",
-        "project_type": request.project_type,
-        "jurisdiction": request.jurisdiction,
-        "document": request.document,
-        "result": None
-    }
-    
     # Check payment first
     if not check_payment():
-        jobs[job_id]["status"] = "payment_failed"
+        jobs.create(job_id, {
+            "status": "payment_failed",
+            "project_type": request.project_type,
+            "jurisdiction": request.jurisdiction,
+            "result": None
+        })
         return {"job_id": job_id, "status": "payment_failed", "error": "Payment verification failed"}
     
-    # Payment succeeded, update status and run workflow
-    jobs[job_id]["status"] = "processing"
-    
-    # Initialize conditional workflow
-    workflow = ConditionalComplianceWorkflow()
-    
-    # Run conditional workflow
-    result = workflow.run_workflow(request.document, request.jurisdiction)
-    
-    # Update job with result
-    jobs[job_id]["status"] = result["status"]
-    jobs[job_id]["result"] = result
+    # Payment succeeded, queue the workflow and return straight away
+    if queue_is_full(TASK_KIND):
+        raise HTTPException(status_code=503, detail="Job queue is full, retry later")
+    jobs.create(job_id, {
+        "status": "queued",
+        "project_type": request.project_type,
+        "jurisdiction": request.jurisdiction,
+        "result": None
+    })
+    work_queue.enqueue(job_id, TASK_KIND, task_payload(request))
+    JOBS.labels("queued").inc()
     
-    return {"job_id": job_id, "status": result["status"], "result": result}
+    return {"job_id": job_id, "status": "queued"}
 
 @app.get("/status")
-async def get_status(job_id: str):
-    if job_id not in jobs:
+async def get_status(job_id: str, format: ResultFormat = "full"):
+    """
+    format: "compact" for the verdict and missing documents, "full" for the
+    match details and summary, "report" for the text report
+    """
+    job = jobs.get(job_id)
+    if job is None:
         return {"error": "Job not found"}
     
-    return {
+    response = {
         "job_id": job_id,
-        "status": jobs[job_id]["status"],
-        "result": jobs[job_id]["result"]
-    }
\ No newline at end of file
+        "status": job["status"],
+        "result": render_result(job["result"], format)
+    }
+    if "error" in job:
+        response["error"] = job["error"]
+    return response
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Batch submission
+# ─────────────────────────────────────────────────────────────────────────────
+@app.post("/start_batch")
+async def start_batch(request: BatchRequest):
+    if not request.items:
+        raise HTTPException(status_code=400, detail="Batch must contain at least one item")
+    if len(request.items) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds the maximum of {MAX_BATCH_SIZE} items")
+
+    if queue_is_full(BATCH_TASK_KIND, len(request.items), BATCH_QUEUE_SIZE):
+        raise HTTPException(status_code=503, detail="Batch queue is full, retry later")
+
+    # The batch and each of its items are jobs; item ids sort in submission order
+    batch_id = str(uuid.uuid4())
+    item_ids = [f"{batch_id}:{index:06d}" for index in range(len(request.items))]
+    jobs.create(batch_id, {"status": "processing", "total": len(request.items), "result": None})
+    jobs.create_many(
+        (item_id, {
+            "status": "queued",
+            "batch_id": batch_id,
+            "project_type": item.project_type,
+            "jurisdiction": item.jurisdiction,
+            "result": None
+        })
+        for item_id, item in zip(item_ids, request.items)
+    )
+    work_queue.enqueue_many(BATCH_TASK_KIND, (
+        (item_id, task_payload(item))
+        for item_id, item in zip(item_ids, request.items)
+    ))
+    JOBS.labels("queued").inc(len(item_ids))
+
+    return {"batch_id": batch_id, "status": "processing", "total": len(request.items)}
+
+@app.get("/batch_status")
+async def get_batch_status(
+    batch_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    format: ResultFormat = "full"
+):
+    batch = jobs.get(batch_id)
+    if batch is None or "total" not in batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    counts = jobs.count_by_status(batch_id)
+    failed = counts.get("failed", 0)
+    pending = counts.get("queued", 0) + counts.get("processing", 0)
+    completed = batch["total"] - failed - pending
+    if pending == 0 and batch["status"] != "completed":
+        jobs.update(batch_id, status="completed")
+    page = jobs.list_by_batch(batch_id, offset, limit)
+    return {
+        "batch_id": batch_id,
+        "status": "completed" if pending == 0 else "processing",
+        "total": batch["total"],
+        "completed": completed,
+        "failed": failed,
+        "pending": pending,
+        "offset": offset,
+        "limit": limit,
+        "items": [
+            {
+                "index": offset + i,
+                "status": item["status"],
+                "project_type": item["project_type"],
+                "jurisdiction": item["jurisdiction"],
+                "result": render_result(item["result"], format),
+                **({"error": item["error"]} if "error" in item else {})
+            }
+            for i, (_, item) in enumerate(page)
+        ]
+    }
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Analytics over every finished job
+# ─────────────────────────────────────────────────────────────────────────────
+@app.get("/analytics")
+async def analytics(
+    jurisdiction: str | None = None,
+    since: date | None = None,
+    until: date | None = None,
+    missing: str | None = Query(None, description="Comma separated documents; counts jobs lacking all of them")
+):
+    """
+    Approval rates, missing-document frequencies and score distributions,
+    per jurisdiction, over the days since..until (inclusive, UTC)
+    """
+    if since is not None and until is not None and since > until:
+        raise HTTPException(status_code=400, detail="since must not be after until")
+    report = outcomes.summarize(jurisdiction, since, until)
+    if missing:
+        if jurisdiction is None:
+            raise HTTPException(status_code=400, detail="missing needs a jurisdiction")
+        documents = [doc.strip() for doc in missing.split(",") if doc.strip()]
+        report["missing_together"] = outcomes.missing_together(jurisdiction, documents, since, until)
+    return report
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text format; includes what the worker processes recorded
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    for task in _job_worker_tasks:
+        task.cancel()
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
@@ -1,4 +1,21 @@
-from agents.compliance_agents import ExtractorAgent, MatcherAgent, SummarizerAgent
+import os
+import threading
+from agents.compliance_agents import ExtractorAgent, MatcherAgent, SummarizerAgent, is_pdf_file, is_pdf_path
+from agents.compliance_report import APPROVAL_THRESHOLD, ComplianceResult, WorkflowResult
+from extraction_cache import cached_parse_document, get_extraction_cache
+from instance_pool import InstancePool
+from metrics import EXTRACTION_CACHE_REQUESTS
+
+# Pass as the jurisdiction to evaluate a document against every rule set at once
+ALL_JURISDICTIONS = "ALL"
+
+# Most workflows a process keeps built (and runs) at once
+WORKFLOW_POOL_SIZE = int(os.getenv("WORKFLOW_POOL_SIZE", 4))
+
+# Match PDFs page by page as they are extracted, stopping once every required
+# document is found; with STOP_WHEN_SETTLED, as soon as the verdict is approval
+PIPELINED_EXTRACTION = os.getenv("PIPELINED_EXTRACTION", "false").lower() == "true"
+STOP_WHEN_SETTLED = os.getenv("STOP_WHEN_SETTLED", "false").lower() == "true"
 
 class BuildingComplianceWorkflow:
     def __init__(self):
@@ -18,27 +35,128 @@ class BuildingComplianceWorkflow:
             backstory='Expert at construction project approvals'
         )
     
-    def run_workflow(self, document, jurisdiction="EU"):
-        # Step 1: Extract
-        extracted_text = self.extractor.parse_document(document)
+    def run_workflow(self, document, jurisdiction="EU", pipelined=None, stop_when_settled=None, content_sha256=None):
+        # document is a path, a binary file object (e.g. an upload) or text;
+        # content_sha256 lets an uploaded PDF hit the extraction cache.
+        # pipelined and stop_when_settled default to PIPELINED_EXTRACTION and STOP_WHEN_SETTLED
+        pipelined = PIPELINED_EXTRACTION if pipelined is None else pipelined
+        stop_when_settled = STOP_WHEN_SETTLED if stop_when_settled is None else stop_when_settled
+
+        # Pipelined mode matches page by page and can stop extraction early
+        if pipelined and jurisdiction != ALL_JURISDICTIONS and (is_pdf_path(document) or is_pdf_file(document)):
+            return self._run_pipelined(document, jurisdiction, stop_when_settled, content_sha256)
+
+        # Step 1: Extract (repeat documents are served from the extraction cache)
+        extracted_text = cached_parse_document(self.extractor, document, content_sha256=content_sha256)
+        index = self.extractor.index_document(extracted_text)
         
         # Step 2: Match with condition check
-        match_results = self.matcher.match_rules(extracted_text, jurisdiction)
+        if jurisdiction == ALL_JURISDICTIONS:
+            return self._run_all_jurisdictions(extracted_text, index)
+        match_results = self.matcher.match_rules(index, jurisdiction)
         
-        # Step 3: Only summarize if conditions met
-        if match_results.get("should_continue", False):
-            summary = self.summarizer.summarize(match_results)
-            return {
-                "status": "completed",
-                "extracted": extracted_text,
-                "matches": match_results,
-                "summary": summary
-            }
+        # Step 3: Only summarize if conditions met (the report itself is rendered on request)
+        return self._finish(extracted_text, match_results)
+
+    def _run_pipelined(self, document, jurisdiction, stop_when_settled, content_sha256=None):
+        """
+        Extract and match in step, one page at a time
+
+        After each page only the required documents still missing are
+        looked up in the growing index. Extraction stops as soon as every
+        required document has been found, or, with stop_when_settled, once
+        the score reaches the approval threshold (it can only go up from
+        there, so the verdict is final, though the missing list may then
+        include documents on unread pages).
+        """
+        # A cached extraction is already complete, so there is nothing to pipeline
+        cache = get_extraction_cache()
+        if is_pdf_path(document):
+            cache_key = cache.key_for(document)
+        elif content_sha256 is not None:
+            cache_key = cache.key_for_digest(content_sha256)
         else:
-            return {
-                "status": "stopped_at_matching",
-                "extracted": extracted_text,
-                "matches": match_results,
-                "summary": "Process stopped - Compliance conditions not met",
-                "reason": "Compliance score too low"
-            }
\ No newline at end of file
+            cache_key = None
+        cached_text = cache.get(cache_key) if cache_key is not None else None
+        if cache_key is not None:
+            EXTRACTION_CACHE_REQUESTS.labels("miss" if cached_text is None else "hit").inc()
+        if cached_text is not None:
+            index = self.extractor.index_document(cached_text)
+            result = self._finish(cached_text, self.matcher.match_rules(index, jurisdiction))
+            result.details["extraction_stopped_early"] = False
+            return result
+
+        pages = []
+        index = self.extractor.index_document("")
+        match = self.matcher.start_match(jurisdiction)
+        stopped_early = False
+        page_stream = self.extractor.parse_document(document, stream=True)
+        try:
+            for page_text in page_stream:
+                pages.append(page_text)
+                index.add_text(page_text)
+                match.update(index)
+                settled = match.total and match.found_count / match.total >= APPROVAL_THRESHOLD
+                if not match.missing_count or (stop_when_settled and settled):
+                    stopped_early = True
+                    break
+            extracted_text = "".join(pages)
+            # Only a full extraction is worth caching
+            if not stopped_early and cache_key is not None:
+                cache.put(cache_key, extracted_text)
+            match_results = self.matcher.finish_match(match, index)
+        except Exception as e:
+            extracted_text = f"Error reading PDF: {str(e)}"
+            index = self.extractor.index_document(extracted_text)
+            match_results = self.matcher.match_rules(index, jurisdiction)
+        finally:
+            page_stream.close()
+
+        result = self._finish(extracted_text, match_results)
+        result.details["pages_read"] = len(pages)
+        result.details["extraction_stopped_early"] = stopped_early
+        return result
+
+    def _run_all_jurisdictions(self, extracted_text, index):
+        # One index scores every jurisdiction; the best fit drives the verdict
+        all_results = self.matcher.match_all(index)
+        best_jurisdiction = all_results["best_jurisdiction"]
+        match_results = all_results["jurisdictions"].get(best_jurisdiction)
+        if match_results is None:
+            # No rules loaded at all: nothing can be found
+            match_results = ComplianceResult((), (), 0, 0)
+
+        result = self._finish(extracted_text, match_results)
+        result.details["best_jurisdiction"] = best_jurisdiction
+        result.details["jurisdictions"] = all_results["jurisdictions"]
+        return result
+
+    def _finish(self, extracted_text, match_results):
+        """
+        Wrap up a run as a WorkflowResult; render() it for the summary.
+        Stopped runs never get a report.
+        """
+        status = "completed" if match_results.should_continue else "stopped_at_matching"
+        return WorkflowResult(status, match_results, extracted_text)
+
+
+# The API and dashboard import the workflow under this name
+ConditionalComplianceWorkflow = BuildingComplianceWorkflow
+
+
+_workflow_pool = None
+_workflow_pool_lock = threading.Lock()
+
+
+def get_workflow_pool():
+    """
+    Return the process-wide pool of prebuilt workflows
+
+    A workflow holds no state between runs (the rules come from the shared
+    registry), so returned instances need no reset.
+    """
+    global _workflow_pool
+    with _workflow_pool_lock:
+        if _workflow_pool is None:
+            _workflow_pool = InstancePool(BuildingComplianceWorkflow, WORKFLOW_POOL_SIZE, name="workflow")
+        return _workflow_pool
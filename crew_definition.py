@@ -9,6 +9,11 @@ class ComplianceCrew:
         self.crew = self.create_crew()
         self.logger.info("ComplianceCrew initialized")
 
+    def reset(self):
+        """Clear the task outputs of the last kickoff so the crew can be reused"""
+        for task in self.crew.tasks:
+            task.output = None
+
     def create_crew(self):
         self.logger.info("Creating compliance crew with agents")
         
@@ -0,0 +1,65 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+CREW_CONCURRENCY = int(os.getenv("CREW_CONCURRENCY", 2))
+# Paid jobs waiting for a crew before /start_job pushes back; enforced by the caller
+CREW_QUEUE_SIZE = int(os.getenv("CREW_QUEUE_SIZE", 50))
+
+
+class CrewExecutor:
+    """
+    Runs blocking crew kickoffs on dedicated threads, off the event loop
+
+    At most max_concurrency runs execute at once; the rest wait their turn.
+    Work that has been paid for is never refused here; the backlog is
+    bounded when jobs are accepted instead.
+    """
+
+    def __init__(self, max_concurrency=CREW_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="crew")
+        self._slots = None
+        self.waiting = 0
+        self.running = 0
+
+    async def run(self, fn, *args, on_start=None):
+        """
+        Run fn(*args) on a crew thread once a slot is free
+
+        Args:
+            fn: Blocking callable to run
+            on_start: Optional callback invoked when the run leaves the queue
+        """
+        if self._slots is None:
+            # Created lazily so it binds to the running event loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            if on_start is not None:
+                on_start()
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            self.running -= 1
+            self._slots.release()
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
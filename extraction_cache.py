@@ -0,0 +1,165 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from logging_config import get_logger
+from agents.compliance_agents import EXTRACTOR_VERSION, is_pdf_file, is_pdf_path
+from metrics import EXTRACTION_CACHE_REQUESTS
+
+logger = get_logger(__name__)
+
+CACHE_DIRECTORY = os.getenv("EXTRACTION_CACHE_DIR", os.path.join("cache", "extraction"))
+CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+
+class ExtractionCache:
+    """
+    Content-addressed on-disk cache of extracted document text
+
+    Entries are keyed by a SHA-256 of the file bytes plus the extractor
+    version, so a resubmitted file hits regardless of its name and a change
+    to the extractor invalidates everything. The directory may be shared by
+    several processes: lookups go to the files themselves, reads touch the
+    file's modification time, and every write rescans the directory and
+    evicts the least recently used entries to keep the total size on disk
+    under max_bytes.
+    """
+
+    def __init__(self, directory=CACHE_DIRECTORY, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first, as last scanned
+        self._total_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        # Rebuild the LRU order from file modification times; the caller holds the lock
+        found = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith(".txt"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        self._entries.clear()
+        self._total_bytes = 0
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def key_for(self, path):
+        """Return the cache key for the file at path"""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return self.key_for_digest(digest.hexdigest())
+
+    def key_for_digest(self, content_sha256):
+        """Return the cache key for content whose SHA-256 is already known, e.g. hashed during upload"""
+        return hashlib.sha256(f"{content_sha256}:extractor-v{EXTRACTOR_VERSION}".encode()).hexdigest()
+
+    def get(self, key):
+        """Return the cached text for key, or None on a miss"""
+        # The file is the source of truth: another process may have written or evicted it
+        try:
+            with open(self._path(key), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            with self._lock:
+                self._total_bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self.hits += 1
+        return data.decode("utf-8")
+
+    def put(self, key, text):
+        """Store text under key, evicting old entries to stay under the size cap"""
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        # Write to a temporary file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+
+        with self._lock:
+            # Entries written by other processes count towards the cap too
+            self._load_index()
+            while self._total_bytes > self.max_bytes and self._entries:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                try:
+                    os.remove(self._path(old_key))
+                except FileNotFoundError:
+                    pass
+                logger.debug(f"Evicted extraction cache entry {old_key}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_extraction_cache():
+    """Return the process-wide extraction cache, creating it on first use"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache()
+        return _cache
+
+
+def cached_parse_document(extractor, document, cache=None, content_sha256=None):
+    """
+    Parse a document through the extraction cache
+
+    Only PDFs are cached: files on disk, or file objects whose SHA-256 is
+    passed as content_sha256. Text input is cheap to "extract" and is
+    passed straight to the extractor. Extraction errors are not cached.
+    """
+    if is_pdf_path(document):
+        cache = cache or get_extraction_cache()
+        key = cache.key_for(document)
+    elif content_sha256 is not None and is_pdf_file(document):
+        cache = cache or get_extraction_cache()
+        key = cache.key_for_digest(content_sha256)
+    else:
+        return extractor.parse_document(document)
+
+    text = cache.get(key)
+    if text is not None:
+        EXTRACTION_CACHE_REQUESTS.labels("hit").inc()
+        logger.info(f"Extraction cache hit for {key[:12]}")
+        return text
+    EXTRACTION_CACHE_REQUESTS.labels("miss").inc()
+
+    text = extractor.parse_document(document)
+    if not text.startswith("Error reading PDF"):
+        cache.put(key, text)
+    return text
@@ -1,12 +1,16 @@
-from fastapi import FastAPI, File, UploadFile, Form
+from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
-import os
-import tempfile
-from conditional_workflow import ConditionalComplianceWorkflow
+from conditional_workflow import get_workflow_pool
+from uploads import form_upload
 
 app = FastAPI()
 
+@app.on_event("startup")
+def warm_workflow_pool():
+    # Build the workflows before the first upload arrives
+    get_workflow_pool().prefill()
+
 # Store workflow results
 workflow_results = {}
 
@@ -53,6 +57,7 @@ async def get_frontend():
                         <option value="India">India</option>
                         <option value="EU">European Union</option>
                         <option value="US">United States</option>
+                        <option value="ALL">Not sure (check all)</option>
                     </select>
                     <br>
                     <button type="submit" id="submitBtn">🚀 Start Compliance Check</button>
@@ -165,25 +170,14 @@ async def get_frontend():
     """
 
 @app.post("/process")
-async def process_document(file: UploadFile = File(...), jurisdiction: str = Form(...)):
-    # Save uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as tmp_file:
-        content = await file.read()
-        tmp_file.write(content)
-        tmp_file_path = tmp_file.name
-    
-    try:
-        # Initialize workflow
-        workflow = ConditionalComplianceWorkflow()
-        
-        # Process the document
-        result = workflow.run_workflow(tmp_file_path, jurisdiction)
-        
-        return result
-        
-    finally:
-        # Clean up temporary file
-        os.unlink(tmp_file_path)
+async def process_document(request: Request):
+    # The form is read under the upload size limit; PDFs are parsed straight from the upload's spool
+    async with form_upload(request, "jurisdiction") as (upload, form):
+        # Borrow a prebuilt workflow and process the document
+        with get_workflow_pool().instance() as workflow:
+            result = workflow.run_workflow(upload.document, form["jurisdiction"], content_sha256=upload.sha256)
+    # The dashboard shows every step, extracted text included
+    return result.render("full", include_text=True)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,113 @@
+import threading
+from contextlib import contextmanager
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class PoolTimeout(TimeoutError):
+    """Raised when no pooled instance frees up within the checkout timeout"""
+
+
+class InstancePool:
+    """
+    A bounded pool of reusable, expensive-to-build objects
+
+    At most max_size instances exist at once. checkout() hands out an idle
+    instance, builds a new one while under the limit, and otherwise blocks
+    until one is returned. checkin() runs the reset hook so the next user
+    gets a clean instance; an instance whose reset fails is dropped and
+    rebuilt later. prefill() builds instances ahead of time so the first
+    requests do not pay the construction cost.
+    """
+
+    def __init__(self, factory, max_size, reset=None, name="pool"):
+        self.factory = factory
+        self.max_size = max_size
+        self.reset = reset
+        self.name = name
+        self._idle = []
+        self._created = 0
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def _reserve(self, timeout=None):
+        """Take an idle instance, or reserve room to build one (returns None)"""
+        with self._cond:
+            while True:
+                if self._idle:
+                    self._in_use += 1
+                    return self._idle.pop()
+                if self._created < self.max_size:
+                    self._created += 1
+                    self._in_use += 1
+                    return None
+                if not self._cond.wait(timeout):
+                    raise PoolTimeout(f"No {self.name} instance free after {timeout}s")
+
+    def _build(self):
+        try:
+            return self.factory()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def checkout(self, timeout=None):
+        """Return an instance for exclusive use; blocks while all are in use"""
+        instance = self._reserve(timeout)
+        if instance is None:
+            instance = self._build()
+        return instance
+
+    def checkin(self, instance):
+        """Hand an instance back, resetting it for the next user"""
+        healthy = True
+        if self.reset is not None:
+            try:
+                self.reset(instance)
+            except Exception as e:
+                logger.warning(f"Dropping {self.name} instance that failed to reset: {str(e)}")
+                healthy = False
+        with self._cond:
+            self._in_use -= 1
+            if healthy:
+                self._idle.append(instance)
+            else:
+                self._created -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def instance(self, timeout=None):
+        instance = self.checkout(timeout)
+        try:
+            yield instance
+        finally:
+            self.checkin(instance)
+
+    def prefill(self, count=None):
+        """Build idle instances until count (default max_size) exist"""
+        target = min(count or self.max_size, self.max_size)
+        built = 0
+        while True:
+            with self._cond:
+                if self._created >= target:
+                    break
+                self._created += 1
+                self._in_use += 1
+            self.checkin(self._build())
+            built += 1
+        if built:
+            logger.info(f"Prefilled {self.name} pool with {built} instances")
+        return built
+
+    def stats(self):
+        with self._cond:
+            return {
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "created": self._created,
+                "max_size": self.max_size,
+            }
@@ -0,0 +1,292 @@
+import json
+import os
+from abc import ABC, abstractmethod
+import sqlite3
+import threading
+import time
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+JOB_STORE_BACKEND = os.getenv("JOB_STORE", "sqlite")
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join("data", "jobs.db"))
+# Finished jobs are evicted this many seconds after they finish
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", 7 * 24 * 3600))
+
+# Statuses a job never leaves; it is stamped finished_at when it reaches one
+FINISHED_STATUSES = ("completed", "failed", "stopped_at_matching", "payment_failed")
+
+
+class JobStore(ABC):
+    """
+    Interface for job storage
+
+    A job is a dict of JSON-serializable fields. The store indexes jobs by
+    id, status, purchaser (identifier_from_purchaser) and batch_id, and
+    forgets finished jobs once they are older than the TTL.
+    """
+
+    @abstractmethod
+    def create(self, job_id, job):
+        """Store a new job under job_id"""
+
+    def create_many(self, items):
+        """Create several jobs at once from (job_id, job) pairs"""
+        for job_id, job in items:
+            self.create(job_id, job)
+
+    @abstractmethod
+    def get(self, job_id):
+        """Return a copy of the job, or None if it does not exist"""
+
+    @abstractmethod
+    def update(self, job_id, **fields):
+        """Set the given fields on a job"""
+
+    @abstractmethod
+    def list_by_status(self, status, limit=1000):
+        """Return (job_id, job) pairs with the given status, oldest first"""
+
+    @abstractmethod
+    def list_by_purchaser(self, purchaser, limit=1000):
+        """Return (job_id, job) pairs of one purchaser, oldest first"""
+
+    @abstractmethod
+    def list_by_batch(self, batch_id, offset=0, limit=1000):
+        """Return (job_id, job) pairs belonging to a batch, in submission order"""
+
+    @abstractmethod
+    def count_by_status(self, batch_id):
+        """Return {status: count} for the jobs in a batch"""
+
+    @abstractmethod
+    def evict_expired(self, now=None):
+        """Drop finished jobs past their TTL; returns the number removed"""
+
+    def __contains__(self, job_id):
+        return self.get(job_id) is not None
+
+
+class InMemoryJobStore(JobStore):
+    """Dict-backed store; nothing survives a restart"""
+
+    def __init__(self, ttl_seconds=JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job_id, job):
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = {**job, "created_at": now, "updated_at": now}
+            if job.get("status") in FINISHED_STATUSES:
+                self._jobs[job_id]["finished_at"] = now
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update(self, job_id, **fields):
+        now = time.time()
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=now)
+            if job.get("status") in FINISHED_STATUSES:
+                job.setdefault("finished_at", now)
+
+    def list_by_status(self, status, limit=1000):
+        with self._lock:
+            matches = [(job_id, dict(job)) for job_id, job in self._jobs.items() if job.get("status") == status]
+        return sorted(matches, key=lambda item: item[1]["created_at"])[:limit]
+
+    def list_by_purchaser(self, purchaser, limit=1000):
+        with self._lock:
+            matches = [
+                (job_id, dict(job)) for job_id, job in self._jobs.items()
+                if job.get("identifier_from_purchaser") == purchaser
+            ]
+        return sorted(matches, key=lambda item: item[1]["created_at"])[:limit]
+
+    def list_by_batch(self, batch_id, offset=0, limit=1000):
+        with self._lock:
+            matches = [(job_id, dict(job)) for job_id, job in self._jobs.items() if job.get("batch_id") == batch_id]
+        return sorted(matches, key=lambda item: (item[1]["created_at"], item[0]))[offset:offset + limit]
+
+    def count_by_status(self, batch_id):
+        counts = {}
+        with self._lock:
+            for job in self._jobs.values():
+                if job.get("batch_id") == batch_id:
+                    counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+    def evict_expired(self, now=None):
+        cutoff = (now or time.time()) - self.ttl_seconds
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.get("finished_at") is not None and job["finished_at"] < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Embedded SQLite store in WAL mode
+
+    Status, purchaser and batch_id are real indexed columns; the rest of
+    the job lives in a JSON column. WAL lets readers proceed while a write
+    is in progress, several processes can share the file, and it survives
+    restarts.
+    """
+
+    def __init__(self, path=JOB_STORE_PATH, ttl_seconds=JOB_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                purchaser TEXT,
+                batch_id TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                finished_at REAL,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+            CREATE INDEX IF NOT EXISTS jobs_purchaser ON jobs (purchaser, created_at);
+            CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at) WHERE finished_at IS NOT NULL;
+        """)
+        # Databases created before batches were stored here lack the column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "batch_id" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN batch_id TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id, created_at, job_id)")
+        # Jobs that finished in a status not counted as finished before were never stamped
+        placeholders = ", ".join("?" * len(FINISHED_STATUSES))
+        self._conn.execute(
+            f"UPDATE jobs SET finished_at = updated_at WHERE finished_at IS NULL AND status IN ({placeholders})",
+            FINISHED_STATUSES
+        )
+
+    @staticmethod
+    def _row_to_job(row):
+        job = json.loads(row[5])
+        job.update(status=row[1], created_at=row[2], updated_at=row[3])
+        if row[4] is not None:
+            job["finished_at"] = row[4]
+        return row[0], job
+
+    def create(self, job_id, job):
+        self.create_many([(job_id, job)])
+
+    def create_many(self, items):
+        # One transaction for the lot, so large batches are not one fsync per job
+        now = time.time()
+        rows = [
+            (
+                job_id, job["status"], job.get("identifier_from_purchaser"), job.get("batch_id"), now, now,
+                now if job["status"] in FINISHED_STATUSES else None,
+                json.dumps({k: v for k, v in job.items() if k != "status"})
+            )
+            for job_id, job in items
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO jobs (job_id, status, purchaser, batch_id, created_at, updated_at, finished_at, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, status, created_at, updated_at, finished_at, data FROM jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        return self._row_to_job(row)[1] if row else None
+
+    def update(self, job_id, **fields):
+        now = time.time()
+        with self._lock:
+            # Read-modify-write of the JSON column, atomic under the lock and transaction
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT status, data, finished_at FROM jobs WHERE job_id = ?", (job_id,)
+                ).fetchone()
+                if row is None:
+                    raise KeyError(job_id)
+                status, data, finished_at = row
+                data = json.loads(data)
+                status = fields.pop("status", status)
+                data.update(fields)
+                if status in FINISHED_STATUSES and finished_at is None:
+                    finished_at = now
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ?, finished_at = ?, data = ? WHERE job_id = ?",
+                    (status, now, finished_at, json.dumps(data), job_id)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _select(self, where, params, limit, offset=0):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_id, status, created_at, updated_at, finished_at, data FROM jobs "
+                f"WHERE {where} ORDER BY created_at, job_id LIMIT ? OFFSET ?",
+                (*params, limit, offset)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def list_by_status(self, status, limit=1000):
+        return self._select("status = ?", (status,), limit)
+
+    def list_by_purchaser(self, purchaser, limit=1000):
+        return self._select("purchaser = ?", (purchaser,), limit)
+
+    def list_by_batch(self, batch_id, offset=0, limit=1000):
+        return self._select("batch_id = ?", (batch_id,), limit, offset)
+
+    def count_by_status(self, batch_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE batch_id = ? GROUP BY status", (batch_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def evict_expired(self, now=None):
+        cutoff = (now or time.time()) - self.ttl_seconds
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,)
+            )
+        return cursor.rowcount
+
+
+def create_job_store():
+    """Create the job store selected by the JOB_STORE environment variable"""
+    if JOB_STORE_BACKEND == "memory":
+        logger.info("Using in-memory job store")
+        return InMemoryJobStore()
+    logger.info(f"Using SQLite job store at {JOB_STORE_PATH}")
+    return SQLiteJobStore()
@@ -0,0 +1,212 @@
+"""
+HTTP load driver for the MIP-003 API in main.py
+
+Each virtual user starts a job, then polls /status until the job
+finishes (or --job-timeout passes), and starts the next one. The report
+gives p50/p95/p99 latency and error rates per endpoint, jobs started and
+finished per second, and end-to-end job time. --ramp runs one step per
+concurrency level to find where throughput stops growing.
+
+    python payment_stub.py --confirm-delay 2 &
+    PAYMENT_SERVICE_URL=http://127.0.0.1:3001/api/v1 PAYMENT_API_KEY=test python main.py api &
+    python load_test.py --ramp 1,2,4,8,16,32 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+FINISHED_STATUSES = ("completed", "failed")
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class EndpointStats:
+    """Latencies and outcomes of one endpoint"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = {}
+
+    def record(self, seconds, error=None):
+        self.latencies.append(seconds)
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    def summary(self, elapsed):
+        count = len(self.latencies)
+        failed = sum(self.errors.values())
+        return {
+            "requests": count,
+            "requests_per_sec": round(count / elapsed, 2) if elapsed else None,
+            "error_rate": round(failed / count, 4) if count else 0.0,
+            "errors": dict(self.errors),
+            **{
+                f"p{int(q * 100)}_ms": round(_percentile(self.latencies, q) * 1000, 2) if count else None
+                for q in (0.50, 0.95, 0.99)
+            },
+        }
+
+
+class LoadRun:
+    """One run at fixed concurrency"""
+
+    def __init__(self, client, base_url, concurrency, duration, poll_interval, job_timeout, wait_for_jobs):
+        self.client = client
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.duration = duration
+        self.poll_interval = poll_interval
+        self.job_timeout = job_timeout
+        self.wait_for_jobs = wait_for_jobs
+        self.endpoints = {"start_job": EndpointStats(), "status": EndpointStats()}
+        self.jobs_started = 0
+        self.jobs_finished = {}
+        self.job_seconds = []
+
+    async def _request(self, endpoint, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, f"{self.base_url}{path}", **kwargs)
+        except Exception as e:
+            self.endpoints[endpoint].record(time.perf_counter() - started, type(e).__name__)
+            return None
+        error = None if response.status_code < 400 else str(response.status_code)
+        self.endpoints[endpoint].record(time.perf_counter() - started, error)
+        return response.json() if error is None else None
+
+    async def _user(self, number, deadline):
+        sequence = 0
+        while time.monotonic() < deadline:
+            sequence += 1
+            body = {
+                "identifier_from_purchaser": f"{number:04x}{sequence:08x}",
+                "input_data": {"text": f"Load test job {sequence} of user {number}"},
+            }
+            started = time.monotonic()
+            job = await self._request("start_job", "POST", "/start_job", json=body)
+            if job is None or "job_id" not in job:
+                # Back off briefly so a failing server is not hammered in a tight loop
+                await asyncio.sleep(self.poll_interval)
+                continue
+            self.jobs_started += 1
+
+            status = None
+            while self.wait_for_jobs and time.monotonic() - started < self.job_timeout:
+                await asyncio.sleep(self.poll_interval)
+                result = await self._request("status", "GET", "/status", params={"job_id": job["job_id"]})
+                status = result.get("status") if result else None
+                if status in FINISHED_STATUSES:
+                    self.jobs_finished[status] = self.jobs_finished.get(status, 0) + 1
+                    self.job_seconds.append(time.monotonic() - started)
+                    break
+            if not self.wait_for_jobs:
+                await self._request("status", "GET", "/status", params={"job_id": job["job_id"]})
+            elif status not in FINISHED_STATUSES:
+                self.jobs_finished["timed_out"] = self.jobs_finished.get("timed_out", 0) + 1
+
+    async def run(self):
+        started = time.monotonic()
+        deadline = started + self.duration
+        await asyncio.gather(*(self._user(number, deadline) for number in range(self.concurrency)))
+        elapsed = time.monotonic() - started
+        completed = self.jobs_finished.get("completed", 0)
+        return {
+            "concurrency": self.concurrency,
+            "elapsed_seconds": round(elapsed, 2),
+            "jobs_started": self.jobs_started,
+            "jobs_started_per_sec": round(self.jobs_started / elapsed, 2),
+            "jobs_finished": dict(self.jobs_finished),
+            "jobs_completed_per_sec": round(completed / elapsed, 2),
+            "job_p50_seconds": round(_percentile(self.job_seconds, 0.50), 2) if self.job_seconds else None,
+            "job_p95_seconds": round(_percentile(self.job_seconds, 0.95), 2) if self.job_seconds else None,
+            "endpoints": {name: stats.summary(elapsed) for name, stats in self.endpoints.items()},
+        }
+
+
+def find_saturation(steps, max_error_rate=0.01):
+    """
+    Return the concurrency past which more users stopped buying throughput
+
+    That is the last step whose jobs/sec grew at least 5% over the best
+    step before it while start_job errors stayed under max_error_rate.
+    """
+    best = None
+    for step in steps:
+        rate = step["jobs_completed_per_sec"] or step["jobs_started_per_sec"]
+        errors = step["endpoints"]["start_job"]["error_rate"]
+        if errors > max_error_rate:
+            break
+        if best is None or rate > best[1] * 1.05:
+            best = (step["concurrency"], rate)
+    return best[0] if best else None
+
+
+def print_step(step):
+    print(
+        f"\nconcurrency {step['concurrency']}: {step['jobs_started']} jobs started "
+        f"({step['jobs_started_per_sec']}/s), finished {step['jobs_finished']} "
+        f"({step['jobs_completed_per_sec']} completed/s), job p50 {step['job_p50_seconds']}s "
+        f"p95 {step['job_p95_seconds']}s"
+    )
+    print(f"  {'endpoint':<12}{'requests':>10}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}")
+    for name, summary in step["endpoints"].items():
+        print(
+            f"  {name:<12}{summary['requests']:>10}{summary['requests_per_sec'] or 0:>9.1f}"
+            f"{summary['p50_ms'] or 0:>10.1f}{summary['p95_ms'] or 0:>10.1f}{summary['p99_ms'] or 0:>10.1f}"
+            f"{summary['error_rate']:>9.2%}"
+        )
+        if summary["errors"]:
+            print(f"  {'':<12}{summary['errors']}")
+
+
+async def run_load(args):
+    import httpx
+
+    levels = [int(level) for level in args.ramp.split(",")] if args.ramp else [args.concurrency]
+    limits = httpx.Limits(max_connections=max(levels) * 2, max_keepalive_connections=max(levels) * 2)
+    steps = []
+    async with httpx.AsyncClient(timeout=args.request_timeout, limits=limits) as client:
+        for concurrency in levels:
+            step = await LoadRun(
+                client, args.url, concurrency, args.duration, args.poll_interval,
+                args.job_timeout, not args.no_wait
+            ).run()
+            print_step(step)
+            steps.append(step)
+    return steps
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive /start_job and /status traffic against main.py")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=8, help="virtual users")
+    parser.add_argument("--ramp", help="comma separated concurrency levels, one step each, e.g. 1,2,4,8")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per step")
+    parser.add_argument("--poll-interval", type=float, default=1, help="seconds between /status polls")
+    parser.add_argument("--job-timeout", type=float, default=120, help="give up polling a job after this")
+    parser.add_argument("--request-timeout", type=float, default=30)
+    parser.add_argument("--no-wait", action="store_true", help="start jobs without waiting for them to finish")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    steps = asyncio.run(run_load(args))
+    results = {"url": args.url, "steps": steps}
+    if len(steps) > 1:
+        results["saturation_concurrency"] = find_saturation(steps)
+        print(f"\nThroughput stops growing beyond concurrency {results['saturation_concurrency']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
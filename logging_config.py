@@ -1,55 +1,211 @@
 import os
+import json
+import time
+import queue
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+# LOG_ASYNC: hand records to a background thread instead of writing them inline
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"
+# LOG_FORMAT: "text" or "json" (one JSON object per line)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+# LOG_LEVELS: per-logger levels, e.g. "httpx=WARNING,payment_poller=DEBUG"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "httpx=WARNING,httpcore=WARNING")
+# LOG_SAMPLED: loggers whose records are rate limited per call site
+LOG_SAMPLED = os.getenv("LOG_SAMPLED", "requests")
+LOG_SAMPLE_RATE = int(os.getenv("LOG_SAMPLE_RATE", 10))
+LOG_SAMPLE_INTERVAL = float(os.getenv("LOG_SAMPLE_INTERVAL", 1))
+
+# Attributes every LogRecord has; anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "suppressed"}
+
+_listener = None
+
+
+def _stop_listener():
+    # Flushes what is still queued, then closes the listener's file handler
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+# Registered once; setup_logging() may replace the listener any number of times
+atexit.register(_stop_listener)
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object, including any extra= fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The plain text format, noting how many similar records were sampled away"""
+
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, "suppressed", 0):
+            text += f" [+{record.suppressed} similar suppressed]"
+        return text
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `rate` records per `interval` seconds per call site
+
+    Meant for hot-path messages such as per-request logs. The first record
+    through after a quiet spell carries a `suppressed` count of what was
+    dropped in between. Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rate=LOG_SAMPLE_RATE, interval=LOG_SAMPLE_INTERVAL):
+        super().__init__()
+        self.rate = rate
+        self.interval = interval
+        self._windows = {}  # (pathname, lineno) -> [window start, passed, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if window[1] < self.rate:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class _PreparedQueueHandler(QueueHandler):
+    """
+    Queues records with their message and traceback already rendered, so
+    the listener thread never touches caller objects, while leaving
+    formatting (text or JSON) to the handlers behind the queue
+    """
+
+    def prepare(self, record):
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_levels(spec):
+    levels = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, level = item.partition("=")
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
 
 def setup_logging(log_level=logging.INFO):
     """
     Configure application-wide logging
-    
+
+    Records go to a rotating file under logs/. With LOG_ASYNC (the default)
+    callers only put records on an in-memory queue and a background thread
+    does the file I/O, so logging never blocks the event loop. LOG_FORMAT,
+    LOG_LEVELS and LOG_SAMPLED control the format, per-logger levels and
+    which loggers are rate limited.
+
     Args:
         log_level: The minimum log level to capture (default: INFO)
-    
+
     Returns:
         logger: Configured logger instance
     """
+    global _listener
+
     # Create logs directory if it doesn't exist
     log_directory = "logs"
     os.makedirs(log_directory, exist_ok=True)
     log_file = os.path.join(log_directory, "app.log")
-    
+
     # Create formatter for consistent log formatting
-    file_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    
+    if LOG_FORMAT == "json":
+        file_formatter = JsonFormatter()
+    else:
+        file_formatter = TextFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
     # Set up rotating file handler (10 MB per file, keep 5 backup files)
     file_handler = RotatingFileHandler(
-        log_file, 
+        log_file,
         maxBytes=10*1024*1024,  # 10 MB
         backupCount=5
     )
     file_handler.setFormatter(file_formatter)
-    
+
     # Configure root logger
     root_logger = logging.getLogger()
     root_logger.setLevel(log_level)
-    
+
     # Remove any existing handlers to prevent duplicates
     for handler in root_logger.handlers[:]:
-        if isinstance(handler, logging.StreamHandler):
+        if isinstance(handler, (logging.StreamHandler, QueueHandler)):
             root_logger.removeHandler(handler)
-    
-    # Add the file handler
-    root_logger.addHandler(file_handler)
-    
+            handler.close()
+    _stop_listener()
+
+    # Add the file handler, behind a queue in async mode
+    if LOG_ASYNC:
+        log_queue = queue.SimpleQueue()
+        _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        root_logger.addHandler(_PreparedQueueHandler(log_queue))
+    else:
+        root_logger.addHandler(file_handler)
+
+    for name, level in _parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    for name in filter(None, (part.strip() for part in LOG_SAMPLED.split(","))):
+        sampled = logging.getLogger(name)
+        if not any(isinstance(f, RateLimitFilter) for f in sampled.filters):
+            sampled.addFilter(RateLimitFilter())
+
     return root_logger
 
 def get_logger(name):
     """
     Get a logger for a specific module
-    
+
     Args:
         name: Usually __name__ from the calling module
-        
+
     Returns:
         A logger instance with the specified name
     """
-    return logging.getLogger(name) 
\ No newline at end of file
+    return logging.getLogger(name)
@@ -1,25 +1,47 @@
 import os
+import asyncio
 import uvicorn
 import uuid
+import time
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
 from fastapi import FastAPI, Query, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field, field_validator
-from masumi.config import Config
-from masumi.payment import Payment, Amount
-from crew_definition import ResearchCrew
-from logging_config import setup_logging
+
+# Load environment variables before the local modules below, which read
+# their settings (CREW_*, JOB_STORE*, WORK_*, LOG_*, ...) when imported
+load_dotenv(override=True)
+
+from crew_executor import CrewExecutor, CREW_QUEUE_SIZE
+from instance_pool import InstancePool
+from payment_poller import PaymentPoller, payment_state
+from payment_status_cache import PaymentStatusCache
+from job_store import create_job_store
+from work_queue import WorkQueue, make_worker_id
+from startup import StartupTracker, print_import_report
+from tracing import tracer, new_trace_id
+from logging_config import setup_logging, get_logger
+from metrics import REGISTRY, JOBS, PAYMENT_CALL_SECONDS, STAGE_SECONDS, Gauge
+
+# masumi and crewai (via crew_definition) are slow to import; they are loaded
+# on first use or by the warm-up at startup, not when this module loads
+if TYPE_CHECKING:
+    from masumi.payment import Payment
 
 # Configure logging
 logger = setup_logging()
-
-# Load environment variables
-load_dotenv(override=True)
+# Per-request messages go through this logger, which is rate limited (LOG_SAMPLED)
+request_logger = get_logger("requests")
 
 # Retrieve API Keys and URLs
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 PAYMENT_SERVICE_URL = os.getenv("PAYMENT_SERVICE_URL")
 PAYMENT_API_KEY = os.getenv("PAYMENT_API_KEY")
 NETWORK = os.getenv("NETWORK")
+# With FAST_START the server answers as soon as it binds and warms up in the
+# background; /ready reports when the warm-up is done
+FAST_START = os.getenv("FAST_START", "false").lower() == "true"
 
 logger.info("Starting application with configuration:")
 logger.info(f"PAYMENT_SERVICE_URL: {PAYMENT_SERVICE_URL}")
@@ -32,18 +54,107 @@ app = FastAPI(
 )
 
 # ─────────────────────────────────────────────────────────────────────────────
-# Temporary in-memory job store (DO NOT USE IN PRODUCTION)
+# Job store (SQLite by default, see job_store.py) and live payment monitors
 # ─────────────────────────────────────────────────────────────────────────────
-jobs = {}
+jobs = create_job_store()
 payment_instances = {}
 
+# How often finished jobs past their TTL are evicted
+JOB_EVICTION_INTERVAL = float(os.getenv("JOB_EVICTION_INTERVAL", 600))
+# How long an idle crew worker waits before polling the work queue again
+WORK_POLL_INTERVAL = float(os.getenv("WORK_POLL_INTERVAL", 1))
+# Purchases awaiting payment before /start_job pushes back; kept apart from the crew queue
+PENDING_PAYMENTS_MAX = int(os.getenv("PENDING_PAYMENTS_MAX", 10000))
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+background_tasks = set()
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# Components /ready waits for; see warm_up()
+startup_tracker = StartupTracker(("payments", "rules", "crews"))
+
+# Crew runs happen on dedicated threads with a bounded wait queue
+crew_executor = CrewExecutor()
+
+def build_crew():
+    from crew_definition import ComplianceCrew
+    return ComplianceCrew(logger=logger)
+
+def reset_crew(crew) -> None:
+    crew.reset()
+
+# Prebuilt crews, one per crew thread, reset between jobs
+crew_pool = InstancePool(build_crew, crew_executor.max_concurrency, reset=reset_crew, name="crew")
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Shared work queue (see work_queue.py)
+# Every process pointed at the same WORK_QUEUE_PATH claims work from it under
+# a lease: "payment_watch" tasks for jobs awaiting payment, "crew" tasks for
+# paid jobs. A process that dies stops renewing its leases and its tasks are
+# picked up by the others.
+# ─────────────────────────────────────────────────────────────────────────────
+# Jobs that still need a payment watch or a crew task
+IN_FLIGHT_STATUSES = ("awaiting_payment", "queued", "running")
+
+def task_exhausted(task_id: str, kind: str, payload: dict) -> None:
+    """
+    Handles a task whose lease expired WORK_MAX_ATTEMPTS times. A payment
+    watch only lapses because its processes went away, so it is re-armed
+    while the job still awaits payment (the poller expires it after
+    payByTime); a crew task that keeps losing its worker fails the job.
+    """
+    job_id = payload["job_id"]
+    job = jobs.get(job_id)
+    if job is None or job["status"] not in IN_FLIGHT_STATUSES:
+        return
+    if kind == "payment_watch" and job["status"] == "awaiting_payment":
+        work_queue.rearm(task_id, kind, payload)
+        logger.warning(f"Re-armed the payment watch of job {job_id}")
+        return
+    logger.error(f"Job {job_id} failed: its {kind} task lost its worker {work_queue.max_attempts} times")
+    jobs.update(job_id, status="failed", error="The job was interrupted too many times")
+    JOBS.labels("failed").inc()
+
+work_queue = WorkQueue(on_exhausted=task_exhausted)
+worker_id = make_worker_id()
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Initialize Masumi Payment Config
 # ─────────────────────────────────────────────────────────────────────────────
-config = Config(
-    payment_service_url=PAYMENT_SERVICE_URL,
-    payment_api_key=PAYMENT_API_KEY
-)
+_payment_config = None
+
+def get_payment_config():
+    """ Builds the Masumi config on first use """
+    global _payment_config
+    if _payment_config is None:
+        from masumi.config import Config
+        _payment_config = Config(
+            payment_service_url=PAYMENT_SERVICE_URL,
+            payment_api_key=PAYMENT_API_KEY
+        )
+    return _payment_config
+
+# One poller watches every pending payment of this process in batched sweeps,
+# and keeps the status cache that /status answers from warm
+payment_status_cache = PaymentStatusCache()
+payment_poller = PaymentPoller(PAYMENT_SERVICE_URL, PAYMENT_API_KEY, NETWORK, status_cache=payment_status_cache)
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Gauges, read when /metrics is scraped (see metrics.py)
+# ─────────────────────────────────────────────────────────────────────────────
+QUEUE_DEPTH = Gauge("work_queue_depth", "Tasks pending in the shared work queue", ["kind"])
+QUEUE_DEPTH.labels("crew").set_function(lambda: work_queue.count("crew"))
+QUEUE_DEPTH.labels("payment_watch").set_function(lambda: work_queue.count("payment_watch"))
+CREWS_IN_FLIGHT = Gauge("crew_jobs_in_flight", "Crew runs in this process", ["state"])
+CREWS_IN_FLIGHT.labels("running").set_function(lambda: crew_executor.running)
+CREWS_IN_FLIGHT.labels("waiting").set_function(lambda: crew_executor.waiting)
+PAYMENTS_TRACKED = Gauge("payments_tracked", "Payments this process is watching")
+PAYMENTS_TRACKED.set_function(lambda: len(payment_poller))
 
 # ─────────────────────────────────────────────────────────────────────────────
 # Pydantic Models
@@ -68,72 +179,139 @@ class ProvideInputRequest(BaseModel):
 # ─────────────────────────────────────────────────────────────────────────────
 # CrewAI Task Execution
 # ─────────────────────────────────────────────────────────────────────────────
-async def execute_crew_task(input_data: str) -> str:
+def run_crew(input_data: str):
+    """ Run a pooled crew; blocks, so it runs on a crew executor thread """
+    with crew_pool.instance() as crew, STAGE_SECONDS.labels("crew_kickoff").time():
+        return crew.crew.kickoff(inputs={"text": input_data})
+
+async def execute_crew_task(input_data: str, on_start=None) -> str:
     """ Execute a CrewAI task with Research and Writing Agents """
-    logger.info(f"Starting CrewAI task with input: {input_data}")
-    crew = ResearchCrew(logger=logger)
-    result = crew.crew.kickoff(inputs={"text": input_data})
+    logger.info("Starting CrewAI task")
+    logger.debug(f"CrewAI task input: {input_data}")
+    result = await crew_executor.run(run_crew, input_data, on_start=on_start)
     logger.info("CrewAI task completed successfully")
     return result
 
+# ─────────────────────────────────────────────────────────────────────────────
+# Payment Helpers
+# ─────────────────────────────────────────────────────────────────────────────
+def build_payment(identifier_from_purchaser: str, input_data: dict) -> "Payment":
+    """ Creates a Masumi payment object for a purchaser's job """
+    from masumi.payment import Payment
+    return Payment(
+        agent_identifier=os.getenv("AGENT_IDENTIFIER"),
+        #amounts=amounts,
+        config=get_payment_config(),
+        identifier_from_purchaser=identifier_from_purchaser,
+        input_data=input_data,
+        network=NETWORK
+    )
+
+def payment_for_job(job: dict) -> "Payment":
+    """ Rebuilds the payment object of a stored job """
+    payment = build_payment(job["identifier_from_purchaser"], job["input_data"])
+    payment.payment_ids.add(job["payment_id"])
+    return payment
+
+def stop_monitoring(job_id: str) -> None:
+    payment = payment_instances.pop(job_id, None)
+    if payment is not None:
+        for payment_id in payment.payment_ids:
+            payment_poller.untrack(payment_id)
+
+async def monitor_payment(job_id: str, payment: "Payment", pay_by=None, created_at=None) -> None:
+    """ Watches a job's payment and queues the job once it is confirmed """
+    async def payment_callback(payment_id: str):
+        await handle_payment_status(job_id, payment_id)
+
+    async def payment_expired(payment_id: str):
+        await handle_payment_expired(job_id, payment_id)
+
+    payment_instances[job_id] = payment
+    request_logger.info(f"Starting payment status monitoring for job {job_id}")
+    for payment_id in payment.payment_ids:
+        payment_poller.track(
+            payment_id, payment_callback, on_expired=payment_expired, created_at=created_at, pay_by=pay_by
+        )
+
+def crew_backlog() -> int:
+    """ Paid jobs waiting for a crew """
+    return work_queue.count("crew")
+
+def payments_outstanding() -> int:
+    """ Accepted jobs whose payment may still arrive """
+    return work_queue.count("payment_watch", ("pending", "claimed"))
+
 # ─────────────────────────────────────────────────────────────────────────────
 # 1) Start Job (MIP-003: /start_job)
 # ─────────────────────────────────────────────────────────────────────────────
 @app.post("/start_job")
 async def start_job(data: StartJobRequest):
     """ Initiates a job and creates a payment request """
-    print(f"Received data: {data}")
-    print(f"Received data.input_data: {data.input_data}")
+    request_logger.debug(f"Received start_job request from {data.identifier_from_purchaser}")
+
+    # Push back before taking payment if the crews are already behind, or if
+    # so many purchases are outstanding that polling for them would not keep up
+    if crew_backlog() >= CREW_QUEUE_SIZE or payments_outstanding() >= PENDING_PAYMENTS_MAX:
+        logger.warning("Crew queue or pending payments are full, rejecting new job")
+        raise HTTPException(
+            status_code=503,
+            detail="Server is at capacity, retry later",
+            headers={"Retry-After": "30"}
+        )
+
     try:
         job_id = str(uuid.uuid4())
         agent_identifier = os.getenv("AGENT_IDENTIFIER")
+
+        # One trace follows the job through payment, queueing and the crew run
+        trace_id = new_trace_id()
+        started = time.time()
+        tracer.begin(trace_id, job_id)
         
         # Log the input text (truncate if too long)
         input_text = data.input_data["text"]
         truncated_input = input_text[:100] + "..." if len(input_text) > 100 else input_text
-        logger.info(f"Received job request with input: '{truncated_input}'")
-        logger.info(f"Starting job {job_id} with agent {agent_identifier}")
+        request_logger.info(
+            f"Starting job {job_id} with agent {agent_identifier}, input: '{truncated_input}'",
+            extra={"trace_id": trace_id}
+        )
 
         # Define payment amounts
         payment_amount = os.getenv("PAYMENT_AMOUNT", "10000000")  # Default 10 ADA
         payment_unit = os.getenv("PAYMENT_UNIT", "lovelace") # Default lovelace
 
+        from masumi.payment import Amount
         amounts = [Amount(amount=payment_amount, unit=payment_unit)]
-        logger.info(f"Using payment amount: {payment_amount} {payment_unit}")
+        request_logger.debug(f"Using payment amount: {payment_amount} {payment_unit}")
         
         # Create a payment request using Masumi
-        payment = Payment(
-            agent_identifier=agent_identifier,
-            #amounts=amounts,
-            config=config,
-            identifier_from_purchaser=data.identifier_from_purchaser,
-            input_data=data.input_data,
-            network=NETWORK
-        )
+        payment = build_payment(data.identifier_from_purchaser, data.input_data)
         
-        logger.info("Creating payment request...")
-        payment_request = await payment.create_payment_request()
+        request_logger.debug("Creating payment request...")
+        with PAYMENT_CALL_SECONDS.labels("create").time(), tracer.span(trace_id, "create_payment_request"):
+            payment_request = await payment.create_payment_request()
         payment_id = payment_request["data"]["blockchainIdentifier"]
         payment.payment_ids.add(payment_id)
-        logger.info(f"Created payment request with ID: {payment_id}")
+        request_logger.info(f"Created payment request with ID: {payment_id}")
 
         # Store job info (Awaiting payment)
-        jobs[job_id] = {
+        jobs.create(job_id, {
             "status": "awaiting_payment",
             "payment_status": "pending",
             "payment_id": payment_id,
+            "pay_by_time": payment_request["data"]["payByTime"],
             "input_data": data.input_data,
             "result": None,
-            "identifier_from_purchaser": data.identifier_from_purchaser
-        }
+            "identifier_from_purchaser": data.identifier_from_purchaser,
+            "trace_id": trace_id
+        })
+        JOBS.labels("awaiting_payment").inc()
 
-        async def payment_callback(payment_id: str):
-            await handle_payment_status(job_id, payment_id)
-
-        # Start monitoring the payment status
-        payment_instances[job_id] = payment
-        logger.info(f"Starting payment status monitoring for job {job_id}")
-        await payment.start_status_monitoring(payment_callback)
+        # Start monitoring the payment status; this process holds the watch
+        work_queue.enqueue(f"watch:{job_id}", "payment_watch", {"job_id": job_id}, owner=worker_id)
+        await monitor_payment(job_id, payment, pay_by=payment_request["data"]["payByTime"])
+        tracer.record(trace_id, "start_job", started, time.time(), job_id=job_id)
 
         # Return the response in the required format
         return {
@@ -167,42 +345,98 @@ async def start_job(data: StartJobRequest):
 # 2) Process Payment and Execute AI Task
 # ─────────────────────────────────────────────────────────────────────────────
 async def handle_payment_status(job_id: str, payment_id: str) -> None:
-    """ Executes CrewAI task after payment confirmation """
+    """ Hands a job to the crew queue once its payment is confirmed """
+    logger.info(f"Payment {payment_id} completed for job {job_id}, queueing task...")
+    stop_monitoring(job_id)
     try:
-        logger.info(f"Payment {payment_id} completed for job {job_id}, executing task...")
-        
-        # Update job status to running
-        jobs[job_id]["status"] = "running"
-        logger.info(f"Input data: {jobs[job_id]["input_data"]}")
+        job = jobs.get(job_id)
+        queued_at = time.time()
+        tracer.record(job.get("trace_id"), "awaiting_payment", job["created_at"], queued_at, payment_id=payment_id)
+        jobs.update(job_id, status="queued", payment_status="confirmed", queued_at=queued_at)
+        JOBS.labels("queued").inc()
+        work_queue.enqueue(f"crew:{job_id}", "crew", {"job_id": job_id})
+        work_queue.complete(f"watch:{job_id}")
+    except Exception as e:
+        # The watch lease lapses and another monitor picks the job up again
+        logger.error(f"Error queueing job {job_id}: {str(e)}", exc_info=True)
+
+async def handle_payment_expired(job_id: str, payment_id: str) -> None:
+    """ Gives up on a job whose payment never arrived """
+    logger.warning(f"Payment {payment_id} for job {job_id} was not made in time")
+    stop_monitoring(job_id)
+    payment_status_cache.invalidate(payment_id)
+    job = jobs.get(job_id)
+    if job is not None:
+        tracer.record(
+            job.get("trace_id"), "awaiting_payment", job["created_at"], time.time(),
+            payment_id=payment_id, outcome="expired"
+        )
+    jobs.update(job_id, status="failed", payment_status="expired", error="Payment was not received before payByTime")
+    JOBS.labels("expired").inc()
+    work_queue.complete(f"watch:{job_id}")
+
+async def run_crew_job(task_id: str, job_id: str) -> None:
+    """ Executes the CrewAI task of a paid job and settles its payment """
+    trace_id = None
+    crew_started = None
+    try:
+        job = jobs.get(job_id)
+        if job is None or job["status"] not in ("queued", "running"):
+            # Gone, or finished before a recovery re-armed its task
+            logger.warning(f"Job {job_id} is no longer waiting for a crew, dropping its crew task")
+            work_queue.complete(task_id, worker_id)
+            return
+        trace_id = job.get("trace_id")
+        input_data = job["input_data"]
+        logger.debug(f"Input data: {input_data}")
+
+        def mark_running():
+            nonlocal crew_started
+            crew_started = time.time()
+            # Queueing covers the shared work queue and the wait for a crew thread
+            if job.get("queued_at") is not None:
+                tracer.record(trace_id, "queued", job["queued_at"], crew_started)
+            jobs.update(job_id, status="running", worker=worker_id)
+            JOBS.labels("running").inc()
 
         # Execute the AI task
-        result = await execute_crew_task(jobs[job_id]["input_data"])
-        result_dict = result.json_dict
+        result = await execute_crew_task(input_data, on_start=mark_running)
+        tracer.record(trace_id, "crew_run", crew_started, time.time())
+        crew_started = None
         logger.info(f"Crew task completed for job {job_id}")
         
-        # Mark payment as completed on Masumi
-        # Use a shorter string for the result hash
-        await payment_instances[job_id].complete_payment(payment_id, result_dict)
+        # Mark payment as completed on Masumi; the result hash is computed
+        # from the raw output string, the same text the store keeps
+        with PAYMENT_CALL_SECONDS.labels("complete").time(), tracer.span(trace_id, "complete_payment"):
+            await payment_for_job(job).complete_payment(job["payment_id"], result.raw)
         logger.info(f"Payment completed for job {job_id}")
 
-        # Update job status
-        jobs[job_id]["status"] = "completed"
-        jobs[job_id]["payment_status"] = "completed"
-        jobs[job_id]["result"] = result
-
-        # Stop monitoring payment status
-        if job_id in payment_instances:
-            payment_instances[job_id].stop_status_monitoring()
-            del payment_instances[job_id]
+        # Update job status (the store keeps the raw crew output)
+        jobs.update(job_id, status="completed", payment_status="completed", result=result.raw)
+        JOBS.labels("completed").inc()
+        work_queue.complete(task_id, worker_id)
+        tracer.record(trace_id, "job", job["created_at"], time.time(), job_id=job_id, outcome="completed")
     except Exception as e:
-        logger.error(f"Error processing payment {payment_id} for job {job_id}: {str(e)}", exc_info=True)
-        jobs[job_id]["status"] = "failed"
-        jobs[job_id]["error"] = str(e)
-        
-        # Still stop monitoring to prevent repeated failures
-        if job_id in payment_instances:
-            payment_instances[job_id].stop_status_monitoring()
-            del payment_instances[job_id]
+        logger.error(f"Error processing job {job_id}: {str(e)}", exc_info=True)
+        if crew_started is not None:
+            tracer.record(trace_id, "crew_run", crew_started, time.time(), error=str(e))
+        jobs.update(job_id, status="failed", error=str(e))
+        JOBS.labels("failed").inc()
+        work_queue.fail(task_id, worker_id, str(e))
+
+async def crew_worker() -> None:
+    """ Claims paid jobs from the shared queue and runs them """
+    while True:
+        try:
+            claimed = work_queue.claim(worker_id, "crew")
+        except Exception as e:
+            logger.error(f"Error claiming a crew task: {str(e)}", exc_info=True)
+            claimed = None
+        if claimed is None:
+            await asyncio.sleep(WORK_POLL_INTERVAL)
+            continue
+        task_id, payload = claimed
+        await run_crew_job(task_id, payload["job_id"])
 
 # ─────────────────────────────────────────────────────────────────────────────
 # 3) Check Job and Payment Status (MIP-003: /status)
@@ -210,29 +444,23 @@ async def handle_payment_status(job_id: str, payment_id: str) -> None:
 @app.get("/status")
 async def get_status(job_id: str):
     """ Retrieves the current status of a specific job """
-    logger.info(f"Checking status for job {job_id}")
-    if job_id not in jobs:
+    request_logger.info(f"Checking status for job {job_id}")
+    job = jobs.get(job_id)
+    if job is None:
         logger.warning(f"Job {job_id} not found")
         raise HTTPException(status_code=404, detail="Job not found")
 
-    job = jobs[job_id]
-
-    # Check latest payment status if payment instance exists
-    if job_id in payment_instances:
+    # Check latest payment status while the job waits for payment; usually
+    # served from the cache the payment poller keeps warm
+    if job["status"] == "awaiting_payment":
         try:
-            status = await payment_instances[job_id].check_payment_status()
-            job["payment_status"] = status.get("data", {}).get("status")
-            logger.info(f"Updated payment status for job {job_id}: {job['payment_status']}")
-        except ValueError as e:
-            logger.warning(f"Error checking payment status: {str(e)}")
-            job["payment_status"] = "unknown"
+            payment = await payment_status_cache.get(job["payment_id"], payment_poller.fetch)
+            job["payment_status"] = payment_state(payment)
         except Exception as e:
             logger.error(f"Error checking payment status: {str(e)}", exc_info=True)
             job["payment_status"] = "error"
 
-
-    result_data = job.get("result")
-    result = result_data.raw if result_data and hasattr(result_data, "raw") else None
+    result = job.get("result")
 
     return {
         "job_id": job_id,
@@ -282,11 +510,124 @@ async def input_schema():
 async def health():
     """
     Returns the health of the server.
+    Liveness only: answers as soon as the server is up, even mid warm-up.
     """
     return {
         "status": "healthy"
     }
 
+@app.get("/ready")
+async def ready():
+    """
+    Returns whether crews, rules and the payment client are warm.
+    Responds 503 until they are, so load balancers hold traffic back.
+    """
+    report = startup_tracker.report()
+    report["status"] = "ready" if report["ready"] else "starting"
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Returns latency histograms, counters and gauges in the Prometheus
+    text format. Recording is a locked add, so this costs the hot path
+    next to nothing; the gauges are only computed here.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    crew_executor.shutdown()
+    await payment_poller.stop()
+
+# ─────────────────────────────────────────────────────────────────────────────
+# 7) Startup Recovery and Job Eviction
+# ─────────────────────────────────────────────────────────────────────────────
+async def recover_jobs() -> None:
+    """
+    Makes sure every in-flight job has a live task in the work queue.
+    Task ids are derived from job ids, so this is a no-op for jobs whose
+    task is pending or claimed; a task that already finished (e.g. failed
+    for good while its job was left in flight) is re-armed, and jobs stored
+    before the queue existed get one. Leased tasks of dead processes are
+    reclaimed by the loops below.
+    """
+    for job_id, job in jobs.list_by_status("awaiting_payment", limit=100000):
+        if work_queue.rearm(f"watch:{job_id}", "payment_watch", {"job_id": job_id}):
+            logger.info(f"Re-armed the payment watch of job {job_id}")
+
+    for status in ("queued", "running"):
+        for job_id, job in jobs.list_by_status(status, limit=100000):
+            if work_queue.rearm(f"crew:{job_id}", "crew", {"job_id": job_id}):
+                logger.info(f"Re-queued paid job {job_id}")
+
+async def adopt_payment_watches() -> None:
+    """
+    Renews this process's leases and takes over payment watches that have
+    no live owner, e.g. because the process that created them went away
+    """
+    while True:
+        try:
+            work_queue.renew_all(worker_id)
+            while (claimed := work_queue.claim(worker_id, "payment_watch")) is not None:
+                task_id, payload = claimed
+                job_id = payload["job_id"]
+                job = jobs.get(job_id)
+                if job is None or job["status"] != "awaiting_payment":
+                    work_queue.complete(task_id, worker_id)
+                    continue
+                await monitor_payment(
+                    job_id, payment_for_job(job), pay_by=job.get("pay_by_time"), created_at=job["created_at"]
+                )
+                logger.info(f"Took over payment monitoring for job {job_id}")
+        except Exception as e:
+            logger.error(f"Error maintaining work queue leases: {str(e)}", exc_info=True)
+        await asyncio.sleep(work_queue.lease_seconds / 3)
+
+async def evict_finished_jobs() -> None:
+    """ Periodically drops finished jobs past their TTL, and old finished tasks """
+    while True:
+        await asyncio.sleep(JOB_EVICTION_INTERVAL)
+        try:
+            evicted = jobs.evict_expired()
+            if evicted:
+                logger.info(f"Evicted {evicted} finished jobs from the job store")
+            purged = work_queue.purge_finished()
+            if purged:
+                logger.info(f"Purged {purged} finished tasks from the work queue")
+        except Exception as e:
+            logger.error(f"Error evicting finished jobs: {str(e)}", exc_info=True)
+
+async def warm_up() -> None:
+    """ Loads the heavy modules and builds crews, off the event loop """
+    from agents.rule_registry import get_rule_registry
+
+    steps = (
+        ("payments", get_payment_config),
+        ("rules", lambda: get_rule_registry().snapshot()),
+        ("crews", crew_pool.prefill),
+    )
+    for component, step in steps:
+        try:
+            with startup_tracker.warming(component):
+                await asyncio.to_thread(step)
+        except Exception:
+            # Recorded by the tracker and reported by /ready
+            pass
+
+@app.on_event("startup")
+async def startup():
+    payment_poller.start()
+    if FAST_START:
+        spawn(warm_up())
+    else:
+        await warm_up()
+    await recover_jobs()
+    spawn(adopt_payment_watches())
+    for _ in range(crew_executor.max_concurrency):
+        spawn(crew_worker())
+    spawn(evict_finished_jobs())
+
 # ─────────────────────────────────────────────────────────────────────────────
 # Main Logic if Called as a Script
 # ─────────────────────────────────────────────────────────────────────────────
@@ -296,7 +637,9 @@ def main():
 
 if __name__ == "__main__":
     import sys
-    if len(sys.argv) > 1 and sys.argv[1] == "api":
+    if len(sys.argv) > 1 and sys.argv[1] == "import-report":
+        print_import_report()
+    elif len(sys.argv) > 1 and sys.argv[1] == "api":
         print("Starting FastAPI server with Masumi integration...")
         uvicorn.run(app, host="0.0.0.0", port=8000)
     else:
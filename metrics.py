@@ -0,0 +1,268 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond matching to multi-minute crew runs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class _Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def _drain(self):
+        with self._lock:
+            value, self.value = self.value, 0.0
+        return value
+
+    def _merge(self, value):
+        self.inc(value)
+
+
+class _Gauge:
+    __slots__ = ("value", "function", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead"""
+        self.function = function
+
+    def read(self):
+        if self.function is None:
+            return self.value
+        try:
+            return self.function()
+        except Exception as e:
+            logger.warning(f"Gauge callback failed: {str(e)}")
+            return float("nan")
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count", "_lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        # Buckets are few, so a linear scan beats bisect's call overhead
+        i = 0
+        for bound in self.buckets:
+            if value <= bound:
+                break
+            i += 1
+        with self._lock:
+            if i < len(self.counts):
+                self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def _drain(self):
+        with self._lock:
+            state = (self.counts, self.sum, self.count)
+            self.counts, self.sum, self.count = [0] * len(self.buckets), 0.0, 0
+        return state
+
+    def _merge(self, state):
+        counts, total, count = state
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, counts)]
+            self.sum += total
+            self.count += count
+
+
+class Metric(ABC):
+    """
+    A named metric, optionally split by labels
+
+    metric.labels("a", "b") returns the child for those label values; an
+    unlabelled metric forwards inc/observe/set straight to its only child.
+    Children are cached, so the hot path is a dict lookup and a locked add.
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, **options):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._options = options
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    @abstractmethod
+    def _new_child(self):
+        """Return the value holder for one combination of label values"""
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _items(self):
+        return list(self._children.items())
+
+    def __getattr__(self, attribute):
+        # Unlabelled metrics: metric.inc() is metric.labels().inc()
+        if attribute.startswith("_") or self.labelnames:
+            raise AttributeError(attribute)
+        return getattr(self.labels(), attribute)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _Counter()
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Gauge()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def _new_child(self):
+        return _Histogram(self._options.get("buckets", DEFAULT_BUCKETS))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class MetricsRegistry:
+    """Holds every metric of a process and renders them for /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics.values():
+            exposed_name = f"{metric.name}_total" if metric.kind == "counter" else metric.name
+            lines.append(f"# HELP {exposed_name} {metric.documentation}")
+            lines.append(f"# TYPE {exposed_name} {metric.kind}")
+            for values, child in metric._items():
+                labels = _format_labels(metric.labelnames, values)
+                if metric.kind == "counter":
+                    lines.append(f"{metric.name}_total{labels} {_format_value(child.value)}")
+                elif metric.kind == "gauge":
+                    lines.append(f"{metric.name}{labels} {_format_value(child.read())}")
+                else:
+                    cumulative = 0
+                    for bound, count in zip(child.buckets, child.counts):
+                        cumulative += count
+                        le = _format_labels(metric.labelnames, values, [("le", _format_value(float(bound)))])
+                        lines.append(f"{metric.name}_bucket{le} {cumulative}")
+                    le = _format_labels(metric.labelnames, values, [("le", "+Inf")])
+                    lines.append(f"{metric.name}_bucket{le} {child.count}")
+                    lines.append(f"{metric.name}_sum{labels} {_format_value(child.sum)}")
+                    lines.append(f"{metric.name}_count{labels} {child.count}")
+        return "\n".join(lines) + "\n"
+
+    def drain(self):
+        """
+        Take and reset the counters and histograms of this process
+
+        Worker processes send this back with their results so the parent,
+        which serves /metrics, can merge() it. Gauges describe the moment
+        and are not transferred.
+        """
+        snapshot = {}
+        for metric in self._metrics.values():
+            if metric.kind == "gauge":
+                continue
+            for values, child in metric._items():
+                snapshot.setdefault(metric.name, []).append((values, child._drain()))
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a drained snapshot from another process into this one"""
+        for name, children in snapshot.items():
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            for values, state in children:
+                metric.labels(*values)._merge(state)
+
+
+REGISTRY = MetricsRegistry()
+
+# ─────────────────────────────────────────────────────────────────────────────
+# Metrics shared by the workflow, agents and both APIs
+# ─────────────────────────────────────────────────────────────────────────────
+STAGE_SECONDS = Histogram(
+    "compliance_stage_seconds", "Time spent in each processing stage", ["stage"]
+)
+PAGES_EXTRACTED = Counter("compliance_pages_extracted", "PDF pages extracted")
+BYTES_PROCESSED = Counter("compliance_bytes_processed", "Bytes of PDF input processed")
+EXTRACTION_CACHE_REQUESTS = Counter(
+    "compliance_extraction_cache_requests", "Extraction cache lookups", ["result"]
+)
+JOBS = Counter("jobs", "Jobs reaching each status", ["status"])
+PAYMENT_CALL_SECONDS = Histogram(
+    "payment_service_call_seconds", "Latency of calls to the Masumi payment service", ["call"]
+)
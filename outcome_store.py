@@ -0,0 +1,345 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from datetime import date
+from agents.compliance_report import APPROVAL_THRESHOLD, WorkflowResult
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+OUTCOME_STORE_PATH = os.getenv("OUTCOME_STORE_PATH", os.path.join("data", "outcomes.db"))
+# Score distribution buckets: 0-10%, 10-20%, ... 90-100%
+SCORE_BUCKETS = 10
+# A mask is one signed 64-bit SQLite integer, so a rule set can track this many documents
+MAX_DOCUMENTS = 63
+
+EPOCH = date(1970, 1, 1)
+
+
+def day_number(moment=None):
+    """UTC day since the epoch, the granularity of the rollups"""
+    return int((time.time() if moment is None else moment) // 86400)
+
+
+def day_of(value):
+    """Day number of a date or an ISO date string"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return (value - EPOCH).days
+
+
+class _Layout:
+    """The bit assignment of one jurisdiction's required documents under one rules version"""
+
+    __slots__ = ("id", "jurisdiction", "rule_version", "documents", "bits")
+
+    def __init__(self, layout_id, jurisdiction, rule_version, documents):
+        self.id = layout_id
+        self.jurisdiction = jurisdiction
+        self.rule_version = rule_version
+        self.documents = tuple(documents)
+        self.bits = {name: 1 << i for i, name in enumerate(self.documents)}
+
+    def encode(self, found_documents):
+        mask = 0
+        for name in found_documents:
+            mask |= self.bits.get(name, 0)
+        return mask
+
+
+class _Rollup:
+    """
+    Per (day, layout) totals: jobs, approvals, misses per document bit,
+    found-count histogram and jobs per distinct mask, for combinations
+    """
+
+    __slots__ = ("jobs", "approved", "missing", "found_histogram", "masks")
+
+    def __init__(self, size):
+        self.jobs = 0
+        self.approved = 0
+        self.missing = array("Q", bytes(8 * size))
+        self.found_histogram = array("Q", bytes(8 * (size + 1)))
+        self.masks = {}
+
+    def add(self, mask, size, jobs=1):
+        """Count jobs that all found the documents in mask"""
+        found = mask.bit_count()
+        self.jobs += jobs
+        if size and found / size >= APPROVAL_THRESHOLD:
+            self.approved += jobs
+        self.found_histogram[found] += jobs
+        self.masks[mask] = self.masks.get(mask, 0) + jobs
+        for bit in range(size):
+            if not mask >> bit & 1:
+                self.missing[bit] += jobs
+
+
+class OutcomeStore:
+    """
+    Compliance outcomes as bitsets, for aggregate analytics
+
+    Each finished job is one row, unique by job id: its day, the layout
+    (jurisdiction and rules version, which fix the order of the required
+    documents) and a 64-bit mask of the documents found. The rows live in
+    SQLite, which every API process shares, with a covering index on
+    (layout, day, mask). In memory there are only rollups per day and
+    layout, so questions like "what share of India jobs this month lacked
+    the Fire NOC" sum a few hundred rollups instead of walking job dicts.
+    Rollups count jobs per distinct mask, which is far fewer entries than
+    jobs, so combinations of documents are answered from them as well.
+
+    Rollups are built by SQL aggregates over the index, one group per
+    distinct mask, and sync() folds in rows other processes stored since
+    the last call. The store is kept apart from the job store, whose
+    finished jobs expire.
+    """
+
+    def __init__(self, path=OUTCOME_STORE_PATH):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS layouts (
+                layout_id INTEGER PRIMARY KEY,
+                jurisdiction TEXT NOT NULL,
+                rule_version TEXT NOT NULL,
+                documents TEXT NOT NULL,
+                UNIQUE (jurisdiction, rule_version)
+            );
+            CREATE TABLE IF NOT EXISTS outcomes (
+                outcome_id INTEGER PRIMARY KEY,
+                day INTEGER NOT NULL,
+                layout_id INTEGER NOT NULL,
+                found INTEGER NOT NULL,
+                job_id TEXT
+            );
+        """)
+        # Stores created before outcomes carried their job id
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(outcomes)")}
+        if "job_id" not in columns:
+            self._conn.execute("ALTER TABLE outcomes ADD COLUMN job_id TEXT")
+        # One outcome per job, however often it is recorded or backfilled
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS outcomes_job ON outcomes (job_id)")
+        # Rollups and combination queries read only this index, never the table
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outcomes_layout_day ON outcomes (layout_id, day, found)")
+        self._layouts = {}
+        self._layout_ids = {}
+        self._rollups = {}
+        self._last_id = 0
+        self.sync()
+
+    # ── layouts ──────────────────────────────────────────────────────────────
+    def _load_layouts(self):
+        for layout_id, jurisdiction, rule_version, documents in self._conn.execute(
+            "SELECT layout_id, jurisdiction, rule_version, documents FROM layouts WHERE layout_id > ?",
+            (max(self._layouts, default=0),)
+        ):
+            layout = _Layout(layout_id, jurisdiction, rule_version, json.loads(documents))
+            self._layouts[layout_id] = layout
+            self._layout_ids[(jurisdiction, rule_version)] = layout_id
+
+    def _layout_for(self, jurisdiction, rule_version, documents):
+        key = (jurisdiction, rule_version or "")
+        layout_id = self._layout_ids.get(key)
+        if layout_id is None:
+            # Sorted, so every process assigns the same bits to the same rules
+            documents = sorted(documents)
+            if len(documents) > MAX_DOCUMENTS:
+                logger.warning(
+                    f"Rules {key[0]!r} version {key[1]!r} require {len(documents)} documents; "
+                    f"outcomes track only the first {MAX_DOCUMENTS}: dropping {documents[MAX_DOCUMENTS:]}"
+                )
+                documents = documents[:MAX_DOCUMENTS]
+            self._conn.execute(
+                "INSERT OR IGNORE INTO layouts (jurisdiction, rule_version, documents) VALUES (?, ?, ?)",
+                (key[0], key[1], json.dumps(documents))
+            )
+            self._load_layouts()
+            layout_id = self._layout_ids[key]
+        return self._layouts[layout_id]
+
+    # ── writing ──────────────────────────────────────────────────────────────
+    def record(self, jurisdiction, result, finished_at=None, job_id=None):
+        """
+        Store the outcome of one job
+
+        Args:
+            jurisdiction: The rule set the job was matched against
+            result: A ComplianceResult
+            finished_at: When the job finished (default: now)
+            job_id: The job's id; a job already recorded is not counted again
+
+        Returns:
+            False if job_id had already been recorded
+        """
+        documents = result.found_documents + result.missing_documents
+        day = day_number(finished_at)
+        with self._lock:
+            layout = self._layout_for(jurisdiction, result.rule_version, documents)
+            found = layout.encode(result.found_documents)
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO outcomes (day, layout_id, found, job_id) VALUES (?, ?, ?, ?)",
+                (day, layout.id, found, job_id)
+            )
+            self._sync_locked()
+        return cursor.rowcount == 1
+
+    def record_job(self, job_id, job, finished_at=None):
+        """
+        Store a finished job from its stored result record
+
+        Returns:
+            False if the job has no result, matched no jurisdiction or was already recorded
+        """
+        record = job.get("result")
+        if not record or "status" not in record:
+            return False
+        result = WorkflowResult.from_record(record)
+        if "best_jurisdiction" in result.details:
+            jurisdiction = result.details["best_jurisdiction"]
+        else:
+            jurisdiction = job.get("jurisdiction")
+        if jurisdiction is None:
+            # An all-jurisdiction run with no rules loaded has nothing to count against
+            return False
+        return self.record(jurisdiction, result.result, finished_at, job_id)
+
+    def _sync_locked(self):
+        self._load_layouts()
+        # Writers are serialized, so no row below the current maximum can still appear
+        last_id = self._conn.execute("SELECT MAX(outcome_id) FROM outcomes").fetchone()[0]
+        if last_id is None or last_id <= self._last_id:
+            return
+        # The first load walks the covering index in group order; later ones seek the new rows by id
+        id_column = "+outcome_id" if self._last_id == 0 else "outcome_id"
+        groups = self._conn.execute(
+            f"SELECT layout_id, day, found, COUNT(*) FROM outcomes WHERE {id_column} > ? AND {id_column} <= ? "
+            "GROUP BY layout_id, day, found",
+            (self._last_id, last_id)
+        )
+        for layout_id, day, found, jobs in groups:
+            size = len(self._layouts[layout_id].documents)
+            rollup = self._rollups.get((day, layout_id))
+            if rollup is None:
+                rollup = self._rollups[(day, layout_id)] = _Rollup(size)
+            rollup.add(found, size, jobs)
+        self._last_id = last_id
+
+    def sync(self):
+        """Load outcomes other processes stored since the last sync"""
+        with self._lock:
+            self._sync_locked()
+
+    def __len__(self):
+        with self._lock:
+            return sum(rollup.jobs for rollup in self._rollups.values())
+
+    # ── analytics ────────────────────────────────────────────────────────────
+    def summarize(self, jurisdiction=None, since=None, until=None):
+        """
+        Aggregate outcomes per jurisdiction over a day range
+
+        Args:
+            jurisdiction: Limit to one jurisdiction (default: all)
+            since, until: Inclusive date bounds (date or "YYYY-MM-DD")
+
+        Returns:
+            dict with overall job and approval counts and, per jurisdiction,
+            the approval rate, how often each required document was
+            missing, and the distribution of compliance scores
+        """
+        first = day_of(since) if since is not None else 0
+        last = day_of(until) if until is not None else 2 ** 32
+        self.sync()
+
+        with self._lock:
+            per_jurisdiction = {}
+            for (day, layout_id), rollup in self._rollups.items():
+                if not first <= day <= last:
+                    continue
+                layout = self._layouts[layout_id]
+                if jurisdiction is not None and layout.jurisdiction != jurisdiction:
+                    continue
+                totals = per_jurisdiction.get(layout.jurisdiction)
+                if totals is None:
+                    totals = per_jurisdiction[layout.jurisdiction] = {
+                        "jobs": 0, "approved": 0, "missing": {}, "checked": {}, "scores": [0] * SCORE_BUCKETS,
+                    }
+                totals["jobs"] += rollup.jobs
+                totals["approved"] += rollup.approved
+                for name, misses in zip(layout.documents, rollup.missing):
+                    totals["missing"][name] = totals["missing"].get(name, 0) + misses
+                    # A document only counts against jobs whose rules required it
+                    totals["checked"][name] = totals["checked"].get(name, 0) + rollup.jobs
+                size = len(layout.documents)
+                for found, jobs in enumerate(rollup.found_histogram):
+                    if jobs:
+                        bucket = min(int(found / size * SCORE_BUCKETS), SCORE_BUCKETS - 1) if size else 0
+                        totals["scores"][bucket] += jobs
+
+        report = {
+            "since": since and str(since),
+            "until": until and str(until),
+            "jobs": sum(t["jobs"] for t in per_jurisdiction.values()),
+            "approved": sum(t["approved"] for t in per_jurisdiction.values()),
+            "jurisdictions": {},
+        }
+        report["approval_rate"] = round(report["approved"] / report["jobs"], 4) if report["jobs"] else None
+        width = 100 // SCORE_BUCKETS
+        for name, totals in sorted(per_jurisdiction.items()):
+            jobs = totals["jobs"]
+            report["jurisdictions"][name] = {
+                "jobs": jobs,
+                "approved": totals["approved"],
+                "approval_rate": round(totals["approved"] / jobs, 4) if jobs else None,
+                "missing_documents": {
+                    doc: {"jobs": misses, "rate": round(misses / totals["checked"][doc], 4)}
+                    for doc, misses in sorted(totals["missing"].items(), key=lambda item: -item[1])
+                },
+                "score_distribution": {
+                    f"{i * width}-{(i + 1) * width}%": count for i, count in enumerate(totals["scores"])
+                },
+            }
+        return report
+
+    def missing_together(self, jurisdiction, documents, since=None, until=None):
+        """
+        Count jobs of a jurisdiction that lacked every one of the documents
+
+        Tests each distinct mask in the rollups once, however many jobs share it.
+        """
+        first = day_of(since) if since is not None else 0
+        last = day_of(until) if until is not None else 2 ** 32
+        self.sync()
+        with self._lock:
+            # Per layout, the bits that must all be clear; layouts lacking a document cannot match
+            wanted = {
+                layout.id: layout.encode(documents) for layout in self._layouts.values()
+                if layout.jurisdiction == jurisdiction and all(doc in layout.bits for doc in documents)
+            }
+            jobs = matched = 0
+            for (day, layout_id), rollup in self._rollups.items():
+                mask = wanted.get(layout_id)
+                if mask is None or not first <= day <= last:
+                    continue
+                jobs += rollup.jobs
+                matched += sum(count for found, count in rollup.masks.items() if not found & mask)
+        return {
+            "documents": list(documents),
+            "jobs": jobs,
+            "missing_all": matched,
+            "rate": round(matched / jobs, 4) if jobs else None,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
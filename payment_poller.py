@@ -0,0 +1,253 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from logging_config import get_logger
+from metrics import PAYMENT_CALL_SECONDS
+
+logger = get_logger(__name__)
+
+# Young payments are polled every MIN seconds, backing off to MAX as they age
+PAYMENT_POLL_MIN_INTERVAL = float(os.getenv("PAYMENT_POLL_MIN_INTERVAL", 10))
+PAYMENT_POLL_MAX_INTERVAL = float(os.getenv("PAYMENT_POLL_MAX_INTERVAL", 120))
+PAYMENT_POLL_PAGE_SIZE = int(os.getenv("PAYMENT_POLL_PAGE_SIZE", 100))
+# Payments still unconfirmed this long after payByTime are given up on
+PAYMENT_EXPIRY_GRACE = float(os.getenv("PAYMENT_EXPIRY_GRACE", 300))
+
+CONFIRMED_STATES = ("FundsLocked", "Complete")
+CONFIRMED_ACTIONS = ("PaymentComplete", "None")
+
+
+def parse_pay_by_time(value):
+    """Turn a payByTime (ISO 8601 or epoch milliseconds) into epoch seconds"""
+    if value is None:
+        return None
+    try:
+        return float(value) / 1000
+    except (TypeError, ValueError):
+        pass
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        logger.warning(f"Unrecognised payByTime {value!r}")
+        return None
+
+
+def is_confirmed(payment):
+    """Same confirmation rule as masumi's Payment.start_status_monitoring"""
+    next_action = (payment.get("NextAction") or {}).get("requestedAction")
+    return payment.get("onChainState") in CONFIRMED_STATES or next_action in CONFIRMED_ACTIONS
+
+
+def payment_state(payment):
+    """Short payment status for API responses, from a payment service record"""
+    if payment is None:
+        return "pending"
+    if is_confirmed(payment):
+        return "confirmed"
+    return payment.get("onChainState") or "pending"
+
+
+class _Tracked:
+    __slots__ = ("callback", "on_expired", "created_at", "pay_by", "next_due")
+
+    def __init__(self, callback, on_expired, created_at, pay_by):
+        self.callback = callback
+        self.on_expired = on_expired
+        self.created_at = created_at
+        self.pay_by = pay_by
+        self.next_due = 0.0
+
+
+class PaymentPoller:
+    """
+    One poller for every pending payment of this process
+
+    Masumi's Payment.start_status_monitoring runs a loop per payment, and
+    each loop pages through the payment service's full /payment/ listing.
+    This poller keeps all tracked blockchainIdentifiers in one table and
+    walks the listing once per sweep over a shared HTTP connection pool,
+    so outbound requests scale with listing pages, not with open jobs.
+
+    Each payment has its own due time: new payments are due every
+    min_interval seconds, older ones back off towards max_interval, and a
+    payment is always due again at its payByTime. A sweep runs whenever
+    any payment is due and refreshes every payment it sees.
+    """
+
+    def __init__(self, payment_service_url, api_key, network,
+                 min_interval=PAYMENT_POLL_MIN_INTERVAL, max_interval=PAYMENT_POLL_MAX_INTERVAL,
+                 page_size=PAYMENT_POLL_PAGE_SIZE, expiry_grace=PAYMENT_EXPIRY_GRACE, status_cache=None):
+        self.payment_service_url = payment_service_url
+        self.api_key = api_key
+        self.network = network
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.page_size = page_size
+        self.expiry_grace = expiry_grace
+        # Optional PaymentStatusCache that every record seen in a sweep is pushed to
+        self.status_cache = status_cache
+        self._tracked = {}
+        self._client = None
+        self._task = None
+        self._wakeup = None
+        self._callbacks = set()
+        self.sweeps = 0
+        self.requests = 0
+
+    def track(self, payment_id, callback, on_expired=None, created_at=None, pay_by=None):
+        """
+        Start watching a payment
+
+        Args:
+            callback: Coroutine function called with payment_id once confirmed
+            on_expired: Optional coroutine function called with payment_id if
+                the payment is still unconfirmed after payByTime plus the grace
+            created_at: When the payment was requested (epoch seconds)
+            pay_by: payByTime as returned by the payment service
+        """
+        entry = _Tracked(callback, on_expired, created_at or time.time(), parse_pay_by_time(pay_by))
+        # A brand new payment cannot have been paid yet, so it joins a later sweep
+        entry.next_due = time.time() + self._interval(entry, time.time())
+        self._tracked[payment_id] = entry
+        if self.status_cache is not None and self.status_cache.peek(payment_id) is None:
+            # Still pending as far as we know; /status need not look it up before the sweep does
+            self.status_cache.put(payment_id, None, expires_at=entry.next_due)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def untrack(self, payment_id):
+        self._tracked.pop(payment_id, None)
+
+    def __len__(self):
+        return len(self._tracked)
+
+    def _interval(self, entry, now):
+        # Back off with age: a tenth of the payment's age, within the bounds
+        interval = min(max((now - entry.created_at) / 10, self.min_interval), self.max_interval)
+        if entry.pay_by is not None and now < entry.pay_by:
+            interval = min(interval, max(entry.pay_by - now, self.min_interval))
+        return interval
+
+    async def _list_payments(self, wanted):
+        """Page through /payment/ until every wanted id has been seen"""
+        found = {}
+        cursor_id = None
+        while True:
+            params = {"network": self.network, "limit": self.page_size}
+            if cursor_id:
+                params["cursorId"] = cursor_id
+            with PAYMENT_CALL_SECONDS.labels("list").time():
+                response = await self._client.get(f"{self.payment_service_url}/payment/", params=params)
+            self.requests += 1
+            if response.status_code != 200:
+                raise Exception(f"Status check failed: {response.text}")
+            data = response.json().get("data", {})
+            payments = data.get("Payments", [])
+            for payment in payments:
+                payment_id = payment.get("blockchainIdentifier")
+                if payment_id in wanted:
+                    found[payment_id] = payment
+            cursor_id = data.get("cursorId")
+            if len(found) == len(wanted) or not cursor_id or len(payments) < self.page_size:
+                return found
+
+    async def fetch(self, payment_id):
+        """Look up a single payment record, or None if the service does not list it"""
+        return (await self._list_payments({payment_id})).get(payment_id)
+
+    async def sweep(self):
+        """Check every tracked payment once; returns the number confirmed"""
+        if not self._tracked:
+            return 0
+        wanted = set(self._tracked)
+        found = await self._list_payments(wanted)
+        self.sweeps += 1
+
+        now = time.time()
+        confirmed = 0
+        for payment_id in wanted:
+            entry = self._tracked.get(payment_id)
+            if entry is None:
+                continue
+            payment = found.get(payment_id)
+            if payment is not None and is_confirmed(payment):
+                logger.info(f"Payment {payment_id} confirmed")
+                del self._tracked[payment_id]
+                confirmed += 1
+                self._fire(entry.callback, payment_id)
+            elif entry.pay_by is not None and now > entry.pay_by + self.expiry_grace:
+                logger.warning(f"Payment {payment_id} not received before payByTime, no longer watching it")
+                del self._tracked[payment_id]
+                if entry.on_expired is not None:
+                    self._fire(entry.on_expired, payment_id)
+            else:
+                entry.next_due = now + self._interval(entry, now)
+            if self.status_cache is not None and payment_id in self._tracked:
+                # Good until this payment's next sweep refreshes it; an unlisted
+                # payment is cached as None so /status does not walk the listing
+                self.status_cache.put(payment_id, payment, expires_at=max(entry.next_due, now + self.status_cache.ttl))
+            elif payment is not None and self.status_cache is not None:
+                self.status_cache.put(payment_id, payment)
+        return confirmed
+
+    def _fire(self, callback, payment_id):
+        async def run():
+            try:
+                await callback(payment_id)
+            except Exception as e:
+                logger.error(f"Error in payment callback for {payment_id}: {str(e)}", exc_info=True)
+        task = asyncio.create_task(run())
+        self._callbacks.add(task)
+        task.add_done_callback(self._callbacks.discard)
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            next_due = min((entry.next_due for entry in self._tracked.values()), default=None)
+            if next_due is not None and next_due <= now:
+                try:
+                    await self.sweep()
+                except Exception as e:
+                    logger.error(f"Error polling payment status: {str(e)}")
+                    # Back off every tracked payment rather than hammering a failing service
+                    for entry in self._tracked.values():
+                        entry.next_due = max(entry.next_due, now + self.min_interval)
+                continue
+
+            # Sleep until the next payment is due, or a new one is tracked
+            self._wakeup.clear()
+            timeout = None if next_due is None else next_due - now
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        """Start polling; call from inside the running event loop"""
+        if self._task is None:
+            import httpx  # loaded here, not at import, to keep cold start short
+            headers = {}
+            if self.api_key:
+                headers["token"] = self.api_key
+            else:
+                # Let the service answer 401 per request rather than fail startup
+                logger.error("PAYMENT_API_KEY is not set; payment status requests will be unauthenticated")
+            self._client = httpx.AsyncClient(
+                headers=headers,
+                timeout=30,
+                limits=httpx.Limits(max_connections=10, max_keepalive_connections=5)
+            )
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self):
+        return {"tracked": len(self._tracked), "sweeps": self.sweeps, "requests": self.requests}
@@ -0,0 +1,103 @@
+import asyncio
+import os
+import time
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# How long a payment status fetched for /status is served before asking again
+PAYMENT_STATUS_TTL = float(os.getenv("PAYMENT_STATUS_TTL", 15))
+# How long "the payment service does not list this payment" is served; kept
+# short because a new payment shows up in the listing soon after creation
+PAYMENT_STATUS_NEGATIVE_TTL = float(os.getenv("PAYMENT_STATUS_NEGATIVE_TTL", 5))
+# Bound on cached payments; the oldest entries go first
+PAYMENT_STATUS_CACHE_SIZE = int(os.getenv("PAYMENT_STATUS_CACHE_SIZE", 50000))
+
+
+class PaymentStatusCache:
+    """
+    Short-lived in-memory cache of payment service records, by payment id
+
+    Entries come from two places: the payment poller pushes every record it
+    sees during a sweep, and get() fetches on a miss. Concurrent misses for
+    the same payment share one upstream call (single flight), so a crowd of
+    clients polling /status costs the payment service one request per TTL.
+    A payment the service does not list (yet) is cached as None for
+    negative_ttl, since finding that out means walking the whole listing.
+    """
+
+    def __init__(self, ttl=PAYMENT_STATUS_TTL, max_entries=PAYMENT_STATUS_CACHE_SIZE,
+                 negative_ttl=PAYMENT_STATUS_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = {}  # payment_id -> (expires_at, record), oldest first
+        self._in_flight = {}
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, payment_id, record, expires_at=None):
+        """
+        Store a record, or None for a payment the service does not list; it
+        is served until expires_at (default now + ttl, or negative_ttl for None)
+        """
+        if expires_at is None:
+            expires_at = time.time() + (self.ttl if record is not None else self.negative_ttl)
+        self._entries.pop(payment_id, None)
+        self._entries[payment_id] = (expires_at, record)
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+    def _fresh(self, payment_id):
+        entry = self._entries.get(payment_id)
+        if entry is None or entry[0] < time.time():
+            return None
+        return entry
+
+    def peek(self, payment_id):
+        """Return the cached record if it is still fresh, else None"""
+        entry = self._fresh(payment_id)
+        return entry[1] if entry is not None else None
+
+    def invalidate(self, payment_id):
+        self._entries.pop(payment_id, None)
+
+    async def get(self, payment_id, fetch):
+        """
+        Return the record for payment_id, calling fetch(payment_id) on a miss
+
+        Args:
+            fetch: Coroutine function returning the record (or None if the
+                payment service does not know the payment)
+        """
+        entry = self._fresh(payment_id)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+
+        in_flight = self._in_flight.get(payment_id)
+        if in_flight is not None:
+            self.hits += 1
+            return await asyncio.shield(in_flight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[payment_id] = future
+        try:
+            record = await fetch(payment_id)
+            self.put(payment_id, record)
+            future.set_result(record)
+            return record
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters get the exception; retrieve it so an unawaited one is not reported
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[payment_id]
+
+    def stats(self):
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
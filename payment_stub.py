@@ -0,0 +1,182 @@
+"""
+A local stand-in for the Masumi payment service, for load tests
+
+Serves the endpoints main.py uses (create a payment request, list
+payments, submit a result) from memory, with configurable latency,
+error rate and time until a payment is confirmed. Never use it outside
+testing: every payment confirms itself.
+
+    python payment_stub.py --port 3001 --latency 0.05 --confirm-delay 5
+    PAYMENT_SERVICE_URL=http://127.0.0.1:3001/api/v1 python main.py api
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from fastapi import APIRouter, FastAPI, Header, HTTPException, Query, Request
+
+# Seconds added to every call, drawn uniformly from latency +/- jitter
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", 0.05))
+STUB_JITTER = float(os.getenv("STUB_JITTER", 0.02))
+# Seconds from creation until a payment shows as FundsLocked
+STUB_CONFIRM_DELAY = float(os.getenv("STUB_CONFIRM_DELAY", 5))
+# Fraction of calls answered with a 500
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", 0))
+# If set, calls must send it in the token header, like the real service
+STUB_API_KEY = os.getenv("STUB_API_KEY")
+
+
+def _iso(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class StubPaymentService:
+    """
+    In-memory payments, listed newest first and paged by cursorId
+
+    A payment is pending until confirm_delay has passed, then FundsLocked,
+    then ResultSubmitted once submit-result is called for it.
+    """
+
+    def __init__(self, latency=STUB_LATENCY, jitter=STUB_JITTER, confirm_delay=STUB_CONFIRM_DELAY,
+                 error_rate=STUB_ERROR_RATE, api_key=STUB_API_KEY):
+        self.latency = latency
+        self.jitter = jitter
+        self.confirm_delay = confirm_delay
+        self.error_rate = error_rate
+        self.api_key = api_key
+        self._payments = []  # oldest first; listed in reverse
+        self._positions = {}
+        self._confirm_at = {}
+        self.calls = {"create": 0, "list": 0, "submit_result": 0, "errors": 0}
+
+    async def call(self, name, token):
+        """Apply the configured latency and failures to one call"""
+        self.calls[name] += 1
+        if self.api_key and token != self.api_key:
+            raise HTTPException(status_code=401, detail="Unauthorized")
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            self.calls["errors"] += 1
+            raise HTTPException(status_code=500, detail="Injected payment service failure")
+
+    def create(self, body):
+        now = datetime.now(timezone.utc)
+        payment_id = uuid.uuid4().hex + uuid.uuid4().hex
+        payment = {
+            "blockchainIdentifier": payment_id,
+            "network": body.get("network"),
+            "agentIdentifier": body.get("agentIdentifier"),
+            "identifierFromPurchaser": body.get("identifierFromPurchaser"),
+            "inputHash": body.get("inputHash"),
+            "onChainState": None,
+            "NextAction": {"requestedAction": "WaitingForExternalAction"},
+            "createdAt": _iso(now),
+            "payByTime": body.get("payByTime") or _iso(now + timedelta(hours=12)),
+            "submitResultTime": body.get("submitResultTime") or _iso(now + timedelta(hours=24)),
+            "unlockTime": _iso(now + timedelta(hours=36)),
+            "externalDisputeUnlockTime": _iso(now + timedelta(hours=48)),
+        }
+        self._positions[payment_id] = len(self._payments)
+        self._payments.append(payment)
+        self._confirm_at[payment_id] = time.monotonic() + self.confirm_delay
+        return payment
+
+    def _refresh(self, payment):
+        confirm_at = self._confirm_at.get(payment["blockchainIdentifier"])
+        if confirm_at is not None and time.monotonic() >= confirm_at:
+            payment["onChainState"] = "FundsLocked"
+            del self._confirm_at[payment["blockchainIdentifier"]]
+        return payment
+
+    def list(self, limit, cursor_id=None):
+        # Newest first; the cursor is the last id of the previous page
+        start = len(self._payments) - 1
+        if cursor_id is not None:
+            position = self._positions.get(cursor_id)
+            if position is None:
+                raise HTTPException(status_code=400, detail="Unknown cursorId")
+            start = position - 1
+        page = [self._refresh(self._payments[i]) for i in range(start, max(start - limit, -1), -1)]
+        data = {"Payments": page}
+        if len(page) == limit and start - limit >= 0:
+            data["cursorId"] = page[-1]["blockchainIdentifier"]
+        return data
+
+    def submit_result(self, body):
+        position = self._positions.get(body.get("blockchainIdentifier"))
+        if position is None:
+            raise HTTPException(status_code=400, detail="Unknown blockchainIdentifier")
+        payment = self._refresh(self._payments[position])
+        if payment["onChainState"] != "FundsLocked":
+            raise HTTPException(status_code=400, detail=f"Payment is {payment['onChainState'] or 'not funded'}")
+        payment["onChainState"] = "ResultSubmitted"
+        payment["NextAction"] = {"requestedAction": "SubmitResultRequested"}
+        payment["resultHash"] = body.get("submitResultHash")
+        return payment
+
+    def stats(self):
+        states = {}
+        for payment in self._payments:
+            state = self._refresh(payment)["onChainState"] or "pending"
+            states[state] = states.get(state, 0) + 1
+        return {"payments": len(self._payments), "states": states, "calls": dict(self.calls)}
+
+
+def create_app(service=None):
+    service = service or StubPaymentService()
+    app = FastAPI(title="Masumi payment service stand-in")
+    router = APIRouter(prefix="/api/v1")
+
+    @router.post("/payment/")
+    async def create_payment(request: Request, token: str | None = Header(None)):
+        await service.call("create", token)
+        return {"status": "success", "data": service.create(await request.json())}
+
+    @router.get("/payment/")
+    async def list_payments(
+        limit: int = Query(10, ge=1, le=1000),
+        cursorId: str | None = None,
+        token: str | None = Header(None)
+    ):
+        await service.call("list", token)
+        return {"status": "success", "data": service.list(limit, cursorId)}
+
+    @router.post("/payment/submit-result")
+    async def submit_result(request: Request, token: str | None = Header(None)):
+        await service.call("submit_result", token)
+        return {"status": "success", "data": service.submit_result(await request.json())}
+
+    @app.get("/stub/stats")
+    async def stats():
+        return service.stats()
+
+    app.include_router(router)
+    app.state.service = service
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the Masumi payment service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3001)
+    parser.add_argument("--latency", type=float, default=STUB_LATENCY, help="seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=STUB_JITTER)
+    parser.add_argument("--confirm-delay", type=float, default=STUB_CONFIRM_DELAY,
+                        help="seconds until a new payment is confirmed")
+    parser.add_argument("--error-rate", type=float, default=STUB_ERROR_RATE, help="fraction of calls that fail")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    service = StubPaymentService(args.latency, args.jitter, args.confirm_delay, args.error_rate)
+    print(f"Payment service stand-in on http://{args.host}:{args.port}/api/v1")
+    uvicorn.run(create_app(service), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
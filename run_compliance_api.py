@@ -1,5 +1,19 @@
+import asyncio
+import sys
 import uvicorn
-from compliance_api import app
+from dotenv import load_dotenv
+
+# Before compliance_api is imported: it and its modules read their settings at import time
+load_dotenv()
+
+from compliance_api import app, backfill_outcomes, run_workers
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # `python run_compliance_api.py worker` runs only the job workers, no HTTP API
+    if len(sys.argv) > 1 and sys.argv[1] == "worker":
+        asyncio.run(run_workers())
+    # `python run_compliance_api.py backfill-outcomes` feeds /analytics from jobs stored before it existed
+    elif len(sys.argv) > 1 and sys.argv[1] == "backfill-outcomes":
+        print(f"Recorded {backfill_outcomes()} job outcomes")
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
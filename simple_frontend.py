@@ -1,11 +1,15 @@
-from fastapi import FastAPI, File, UploadFile, Form
+from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse
-import tempfile
-import os
-from conditional_workflow import BuildingComplianceWorkflow
+from conditional_workflow import get_workflow_pool
+from uploads import form_upload
 
 app = FastAPI()
 
+@app.on_event("startup")
+def warm_workflow_pool():
+    # Build the workflows before the first upload arrives
+    get_workflow_pool().prefill()
+
 @app.get("/")
 async def home():
     html_content = """
@@ -41,6 +45,7 @@ async def home():
                     <option value="India">India</option>
                     <option value="EU">Europe (EU)</option>
                     <option value="UK">United Kingdom</option>
+                    <option value="ALL">Not sure (check all)</option>
                 </select><br>
                 <button type="submit">🏗️ Check Construction Approval</button>
             </form>
@@ -114,20 +119,14 @@ async def home():
     return HTMLResponse(content=html_content)
 
 @app.post("/process")
-async def process_file(file: UploadFile = File(...), jurisdiction: str = Form(...)):
-    # Save uploaded file
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.txt') as tmp_file:
-        content = await file.read()
-        tmp_file.write(content)
-        tmp_file_path = tmp_file.name
-    
-    try:
+async def process_file(request: Request):
+    # The form is read under the upload size limit; PDFs are parsed straight from the upload's spool
+    async with form_upload(request, "jurisdiction") as (upload, form):
         # Process with workflow
-        workflow = BuildingComplianceWorkflow()
-        result = workflow.run_workflow(tmp_file_path, jurisdiction)
-        return result
-    finally:
-        os.unlink(tmp_file_path)
+        with get_workflow_pool().instance() as workflow:
+            result = workflow.run_workflow(upload.document, form["jurisdiction"], content_sha256=upload.sha256)
+    # The dashboard shows every step, extracted text included
+    return result.render("full", include_text=True)
 
 def find_free_port():
     import socket
@@ -0,0 +1,94 @@
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Modules that dominate cold start, in the order the app would load them
+HEAVY_MODULES = (
+    "httpx",
+    "aiohttp",
+    "masumi.payment",
+    "PyPDF2",
+    "crewai",
+    "agents.compliance_agents",
+    "crew_definition",
+)
+
+
+class StartupTracker:
+    """
+    Tracks which components of the app are warm, and how long each took
+
+    Components are registered up front, marked ready by warm-up code, and
+    reported by the readiness endpoint. A component that fails to warm up
+    keeps its error so readiness can say why.
+    """
+
+    def __init__(self, components):
+        self.started_at = time.time()
+        self._state = {name: {"ready": False} for name in components}
+
+    @contextmanager
+    def warming(self, component):
+        """Time a warm-up step and mark the component ready when it succeeds"""
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self._state[component] = {"ready": False, "error": str(e)}
+            logger.error(f"Warming up {component} failed: {str(e)}", exc_info=True)
+            raise
+        seconds = round(time.perf_counter() - started, 3)
+        self._state[component] = {"ready": True, "seconds": seconds}
+        logger.info(f"{component} warm after {seconds}s")
+
+    @property
+    def ready(self):
+        return all(state["ready"] for state in self._state.values())
+
+    def report(self):
+        return {
+            "ready": self.ready,
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "components": {name: dict(state) for name, state in self._state.items()},
+        }
+
+
+def measure_imports(modules=HEAVY_MODULES):
+    """
+    Import each module and time it
+
+    A module already imported costs nothing, and shared dependencies are
+    charged to the first module that pulls them in, so run this in a fresh
+    interpreter for meaningful numbers (see print_import_report).
+
+    Returns:
+        list of (module, seconds, error) tuples
+    """
+    timings = []
+    for name in modules:
+        already_loaded = name in sys.modules
+        started = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            error = "already imported" if already_loaded else None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        timings.append((name, time.perf_counter() - started, error))
+    return timings
+
+
+def print_import_report(modules=HEAVY_MODULES):
+    """Print where cold-start import time goes, slowest first"""
+    timings = measure_imports(modules)
+    total = sum(seconds for _, seconds, _ in timings)
+    print(f"{'module':<28}{'seconds':>10}{'share':>8}")
+    for name, seconds, error in sorted(timings, key=lambda t: t[1], reverse=True):
+        share = f"{seconds / total:.0%}" if total else "-"
+        note = f"  ({error})" if error else ""
+        print(f"{name:<28}{seconds:>10.3f}{share:>8}{note}")
+    print(f"{'total':<28}{total:>10.3f}")
+    print("For a per-module breakdown run: python -X importtime main.py import-report")
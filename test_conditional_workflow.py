@@ -0,0 +1,69 @@
+import pytest
+
+import extraction_cache
+from benchmark import build_pdf
+from conditional_workflow import BuildingComplianceWorkflow
+
+FILLER = ["the rear extension is shown on the attached drawings"] * 5
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(extraction_cache, "_cache", extraction_cache.ExtractionCache(str(tmp_path / "cache")))
+
+
+@pytest.fixture
+def workflow():
+    return BuildingComplianceWorkflow()
+
+
+def write_pdf(tmp_path, pages):
+    path = tmp_path / "permit.pdf"
+    path.write_bytes(build_pdf(pages))
+    return str(path)
+
+
+def test_pipelined_run_stops_once_every_document_is_found(tmp_path, workflow):
+    path = write_pdf(tmp_path, [
+        ["Planning permission granted", "Building regulations approval", "Structural engineer report"],
+        ["Fire safety certificate", "Building control approval", "Party wall award", "Drainage layout"],
+        FILLER, FILLER, FILLER,
+    ])
+
+    result = workflow.run_workflow(path, "UK", pipelined=True)
+
+    assert result.details["pages_read"] == 2
+    assert result.details["extraction_stopped_early"]
+    assert result.result.missing_documents == ()
+    # A partial extraction is not cached
+    assert extraction_cache._cache.stats()["entries"] == 0
+
+
+def test_stop_when_settled_stops_at_the_approval_threshold(tmp_path, workflow):
+    path = write_pdf(tmp_path, [
+        ["Planning permission granted", "Building regulations approval", "Structural engineer report",
+         "Fire safety certificate", "Building control approval", "Party wall award"],
+        FILLER,
+        ["Drainage layout"],
+    ])
+
+    settled = workflow.run_workflow(path, "UK", pipelined=True, stop_when_settled=True)
+    full = workflow.run_workflow(path, "UK", pipelined=True)
+
+    assert settled.details["pages_read"] == 1
+    assert settled.result.missing_documents == ("Drainage and Utilities Plan",)
+    assert settled.status == full.status == "completed"
+    assert full.details["pages_read"] == 3
+    assert full.result.missing_documents == ()
+
+
+def test_pipelined_run_matches_the_whole_document_when_something_is_missing(tmp_path, workflow):
+    path = write_pdf(tmp_path, [["Planning permission granted"], FILLER, ["Drainage layout"]])
+
+    pipelined = workflow.run_workflow(path, "UK", pipelined=True)
+    serial = workflow.run_workflow(path, "UK", pipelined=False)
+
+    assert pipelined.details["pages_read"] == 3
+    assert not pipelined.details["extraction_stopped_early"]
+    assert pipelined.result.found_documents == serial.result.found_documents
+    assert pipelined.status == serial.status == "stopped_at_matching"
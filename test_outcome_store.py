@@ -0,0 +1,136 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+from agents.compliance_report import ComplianceResult, WorkflowResult
+from outcome_store import MAX_DOCUMENTS, OutcomeStore, day_of
+
+DOCUMENTS = ["Building Permit", "Fire NOC", "Site Plan", "Structural Certificate", "Environmental Clearance"]
+JAN_10 = day_of("2026-01-10") * 86400 + 3600
+FEB_10 = day_of("2026-02-10") * 86400 + 3600
+
+
+def result(*found, documents=DOCUMENTS, rule_version="1.0"):
+    missing = [doc for doc in documents if doc not in found]
+    return ComplianceResult(found, missing, 0, len(documents), rule_version)
+
+
+@pytest.fixture
+def store(tmp_path):
+    outcome_store = OutcomeStore(str(tmp_path / "outcomes.db"))
+    yield outcome_store
+    outcome_store.close()
+
+
+def test_summary_counts_approvals_misses_and_scores(store):
+    store.record("India", result(*DOCUMENTS), JAN_10, "a")
+    store.record("India", result(*DOCUMENTS[:4]), JAN_10, "b")
+    store.record("India", result("Building Permit"), JAN_10, "c")
+    store.record("UK", result(), JAN_10, "d")
+
+    report = store.summarize("India")
+    india = report["jurisdictions"]["India"]
+
+    assert report["jobs"] == 3 and list(report["jurisdictions"]) == ["India"]
+    assert india["approved"] == 2
+    assert india["missing_documents"]["Environmental Clearance"] == {"jobs": 2, "rate": 0.6667}
+    assert india["missing_documents"]["Building Permit"] == {"jobs": 0, "rate": 0.0}
+    assert india["score_distribution"]["20-30%"] == 1
+    assert india["score_distribution"]["80-90%"] == 1
+    assert india["score_distribution"]["90-100%"] == 1
+
+
+def test_a_job_is_recorded_once(store):
+    assert store.record("India", result(*DOCUMENTS), JAN_10, "a")
+    assert not store.record("India", result(), JAN_10, "a")
+
+    assert len(store) == 1
+    assert store.summarize()["approved"] == 1
+
+
+def test_day_range_limits_the_summary(store):
+    store.record("India", result(), JAN_10, "a")
+    store.record("India", result(), FEB_10, "b")
+
+    assert store.summarize(since="2026-02-01")["jobs"] == 1
+    assert store.summarize(until=date(2026, 1, 31))["jobs"] == 1
+    assert store.summarize(since="2026-03-01")["jobs"] == 0
+
+
+def test_missing_together_counts_jobs_lacking_every_document(store):
+    store.record("India", result("Site Plan"), JAN_10, "a")
+    store.record("India", result("Fire NOC"), JAN_10, "b")
+    store.record("India", result(), FEB_10, "c")
+    store.record("India", result(*DOCUMENTS), FEB_10, "d")
+
+    assert store.missing_together("India", ["Fire NOC", "Building Permit"]) == {
+        "documents": ["Fire NOC", "Building Permit"], "jobs": 4, "missing_all": 2, "rate": 0.5,
+    }
+    assert store.missing_together("India", ["Fire NOC"], since="2026-02-01")["missing_all"] == 1
+    assert store.missing_together("India", ["Unknown Document"])["jobs"] == 0
+
+
+def test_rule_versions_keep_their_own_layouts(store):
+    store.record("India", result("Fire NOC"), JAN_10, "a")
+    store.record("India", result("Fire NOC", documents=["Fire NOC", "Lift Certificate"], rule_version="2.0"), JAN_10, "b")
+
+    india = store.summarize()["jurisdictions"]["India"]
+
+    assert india["missing_documents"]["Fire NOC"] == {"jobs": 0, "rate": 0.0}
+    assert india["missing_documents"]["Lift Certificate"] == {"jobs": 1, "rate": 1.0}
+    assert india["missing_documents"]["Site Plan"] == {"jobs": 1, "rate": 1.0}
+
+
+def test_other_processes_see_recorded_outcomes(store):
+    store.record("India", result(*DOCUMENTS), JAN_10, "a")
+    other = OutcomeStore(store.path)
+    store.record("India", result(), JAN_10, "b")
+
+    assert len(other) == 1
+    assert other.summarize()["jobs"] == 2
+    assert other.missing_together("India", ["Fire NOC"])["missing_all"] == 1
+    other.close()
+
+
+def test_record_job_reads_stored_results(store):
+    completed = WorkflowResult("completed", result(*DOCUMENTS)).to_record()
+    all_jurisdictions = {**completed, "best_jurisdiction": "UK"}
+
+    assert store.record_job("a", {"jurisdiction": "India", "result": completed}, JAN_10)
+    assert store.record_job("b", {"jurisdiction": "ALL", "result": all_jurisdictions}, JAN_10)
+    assert not store.record_job("c", {"jurisdiction": None, "result": completed}, JAN_10)
+    assert not store.record_job("d", {"jurisdiction": "India", "result": None}, JAN_10)
+
+    assert sorted(store.summarize()["jurisdictions"]) == ["India", "UK"]
+
+
+def test_documents_past_the_mask_width_are_logged(store, caplog):
+    documents = [f"Document {i:02d}" for i in range(MAX_DOCUMENTS + 2)]
+
+    store.record("Large", result(*documents, documents=documents), JAN_10, "a")
+
+    assert "Document 63" in caplog.text and "Document 64" in caplog.text
+    assert len(store.summarize()["jurisdictions"]["Large"]["missing_documents"]) == MAX_DOCUMENTS
+
+
+def test_stores_without_job_ids_are_migrated(tmp_path):
+    path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        CREATE TABLE layouts (layout_id INTEGER PRIMARY KEY, jurisdiction TEXT NOT NULL, rule_version TEXT NOT NULL,
+                              documents TEXT NOT NULL, UNIQUE (jurisdiction, rule_version));
+        CREATE TABLE outcomes (outcome_id INTEGER PRIMARY KEY, day INTEGER NOT NULL, layout_id INTEGER NOT NULL,
+                               found INTEGER NOT NULL);
+        INSERT INTO layouts VALUES (1, 'UK', '1.0', '["Fire Safety", "Party Wall"]');
+        INSERT INTO outcomes (day, layout_id, found) VALUES (20000, 1, 1), (20000, 1, 3);
+    """)
+    conn.commit()
+    conn.close()
+
+    store = OutcomeStore(path)
+
+    assert len(store) == 2
+    assert store.summarize()["jurisdictions"]["UK"]["missing_documents"]["Party Wall"]["jobs"] == 1
+    assert store.record("UK", result(documents=["Fire Safety", "Party Wall"]), JAN_10, "new")
+    store.close()
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+from uploads import form_upload, read_form
+
+MAX_BYTES = 1024
+BOUNDARY = "testboundary"
+
+app = FastAPI()
+
+
+@app.post("/upload")
+async def upload(request: Request):
+    async with form_upload(request, "jurisdiction", max_bytes=MAX_BYTES) as (received, form):
+        return {
+            "is_pdf": received.is_pdf,
+            "size": received.size,
+            "text": None if received.is_pdf else received.document,
+            "jurisdiction": form["jurisdiction"],
+        }
+
+
+client = TestClient(app)
+
+
+def multipart(content, **fields):
+    parts = [
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        for name, value in fields.items()
+    ]
+    parts.append(
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="doc"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n".encode() + content + b"\r\n"
+    )
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def post(body):
+    return client.post("/upload", content=body, headers={"content-type": f"multipart/form-data; boundary={BOUNDARY}"})
+
+
+def fake_request(receive, headers):
+    headers = {"content-type": f"multipart/form-data; boundary={BOUNDARY}", **headers}
+    scope = {
+        "type": "http", "method": "POST", "path": "/upload", "query_string": b"",
+        "headers": Headers(headers).raw,
+    }
+    return Request(scope, receive)
+
+
+def test_text_upload_is_decoded():
+    response = post(multipart("Fire NOC issued – ok".encode(), jurisdiction="India"))
+
+    assert response.status_code == 200
+    assert response.json() == {"is_pdf": False, "size": 22, "text": "Fire NOC issued – ok", "jurisdiction": "India"}
+
+
+def test_pdf_upload_is_kept_as_bytes():
+    response = post(multipart(b"%PDF-1.4 rest of the file", jurisdiction="UK"))
+
+    assert response.json()["is_pdf"] is True
+
+
+def test_file_over_the_limit_is_refused():
+    response = post(multipart(b"x" * (MAX_BYTES + 1), jurisdiction="UK"))
+
+    assert response.status_code == 413
+
+
+def test_missing_fields_are_reported():
+    response = post(multipart(b"text"))
+
+    assert response.status_code == 422
+    assert "jurisdiction" in response.json()["detail"]
+
+
+def test_non_multipart_body_is_rejected():
+    response = client.post("/upload", content=b"{}", headers={"content-type": "application/json"})
+
+    assert response.status_code == 400
+
+
+def test_content_length_over_the_limit_is_refused_before_reading():
+    received = []
+
+    async def receive():
+        received.append(1)
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    request = fake_request(receive, {"content-length": str(10 * 1024 * 1024)})
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(read_form(request, MAX_BYTES))
+
+    assert error.value.status_code == 413
+    assert received == []
+
+
+def test_streamed_body_is_cut_off_at_the_limit():
+    # No Content-Length: the body is refused while it arrives, not once it has all been read
+    chunk = b"x" * 16 * 1024
+    head = multipart(b"")[:-len(f"\r\n--{BOUNDARY}--\r\n")]
+    chunks_sent = 0
+
+    async def receive():
+        nonlocal chunks_sent
+        chunks_sent += 1
+        return {"type": "http.request", "body": head if chunks_sent == 1 else chunk, "more_body": True}
+
+    request = fake_request(receive, {})
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(read_form(request, MAX_BYTES))
+
+    assert error.value.status_code == 413
+    # The form overhead allowance is 64 KB, so a handful of chunks at most
+    assert chunks_sent < 10
+
@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from work_queue import WorkQueue
+
+
+@pytest.fixture
+def exhausted():
+    return []
+
+
+@pytest.fixture
+def queue(tmp_path, exhausted):
+    work_queue = WorkQueue(
+        str(tmp_path / "queue.db"), lease_seconds=0.05, max_attempts=2,
+        on_exhausted=lambda task_id, kind, payload: exhausted.append((task_id, kind, payload))
+    )
+    yield work_queue
+    work_queue._conn.close()
+
+
+def test_claims_oldest_pending_task_once(queue):
+    assert queue.enqueue("a", "crew", {"n": 1})
+    assert queue.enqueue("b", "crew", {"n": 2})
+    assert not queue.enqueue("a", "crew", {"n": 3})
+
+    assert queue.claim("w1", "crew") == ("a", {"n": 1})
+    assert queue.claim("w2", "crew") == ("b", {"n": 2})
+    assert queue.claim("w3", "crew") is None
+    assert queue.count("crew", ("pending", "claimed")) == 2
+
+
+def test_claims_kinds_in_priority_order(queue):
+    queue.enqueue("batch", "low", {})
+    queue.enqueue("single", "high", {})
+
+    assert queue.claim("w1", ("high", "low"))[0] == "single"
+    assert queue.claim("w1", ("high", "low"))[0] == "batch"
+
+
+def test_expired_lease_returns_task_to_pending(queue):
+    queue.enqueue("a", "crew", {})
+    queue.claim("dead", "crew")
+    time.sleep(0.1)
+
+    assert queue.claim("w2", "crew") == ("a", {})
+    # The first worker lost its claim
+    assert not queue.heartbeat("a", "dead")
+    assert not queue.complete("a", "dead")
+    assert queue.complete("a", "w2")
+
+
+def test_heartbeat_keeps_the_claim(queue):
+    queue.enqueue("a", "crew", {})
+    queue.claim("w1", "crew")
+    for _ in range(3):
+        time.sleep(0.03)
+        assert queue.renew_all("w1") == 1
+
+    assert queue.claim("w2", "crew") is None
+
+
+def test_exhausted_task_fails_and_is_reported(queue, exhausted):
+    queue.enqueue("a", "crew", {"job": 1})
+    for _ in range(2):
+        assert queue.claim("dead", "crew") is not None
+        time.sleep(0.1)
+
+    assert queue.claim("w2", "crew") is None
+    assert queue.count("crew", "failed") == 1
+    assert exhausted == [("a", "crew", {"job": 1})]
+
+
+def test_rearm_resets_finished_tasks_only(queue):
+    queue.enqueue("a", "watch", {"v": 1})
+    queue.claim("w1", "watch")
+    assert not queue.rearm("a", "watch", {"v": 2})
+
+    queue.fail("a", "w1", "gone")
+    assert queue.rearm("a", "watch", {"v": 2})
+    assert queue.claim("w1", "watch") == ("a", {"v": 2})
+
+    assert queue.rearm("new", "watch", {})
+    assert queue.count("watch") == 1
+
+
+def test_purge_finished_deletes_old_done_and_failed_tasks(queue):
+    for task_id in "abc":
+        queue.enqueue(task_id, "crew", {})
+    queue.complete("a")
+    queue.fail("b")
+
+    assert queue.purge_finished(older_than_seconds=3600) == 0
+    time.sleep(0.01)
+    assert queue.purge_finished(older_than_seconds=0) == 2
+    assert queue.count("crew", ("pending", "claimed", "done", "failed")) == 1
@@ -0,0 +1,179 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# TRACING: set to false to stop writing job traces
+TRACING = os.getenv("TRACING", "true").lower() == "true"
+# Where spans are appended; open it in Perfetto (ui.perfetto.dev) or chrome://tracing
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join("traces", "jobs.trace.json"))
+# Once the file reaches this size it is moved to TRACE_FILE.1 and a new one started; 0 never rotates
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", 100 * 1024 * 1024))
+
+_STOP = object()
+
+
+def new_trace_id():
+    return uuid.uuid4().hex
+
+
+def _trace_pid(trace_id):
+    # Each trace gets its own process row in the viewer, so one job reads top to bottom
+    return int(trace_id[:7], 16)
+
+
+class Tracer:
+    """
+    Writes per-job spans in the Chrome trace event format
+
+    A job keeps its trace id for life, so spans recorded by different
+    processes (the one that took the payment, the one that ran the crew)
+    line up under the same job. Spans are wall-clock based for the same
+    reason. The file uses the JSON array format without a closing bracket,
+    which the viewers accept, so every process can simply append to it.
+
+    Events are queued and written by a background thread, so recording a
+    span never touches the disk on the caller's thread (or event loop).
+    The file is rotated to path.1 when it reaches max_bytes; writers in
+    other processes notice the rotation and reopen the new file.
+    """
+
+    def __init__(self, path=TRACE_FILE, enabled=TRACING, max_bytes=TRACE_MAX_BYTES):
+        self.path = path
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self._file = None
+        self._queue = None
+        self._writer = None
+        self._writer_pid = None
+        self._lock = threading.Lock()
+        self._close_registered = False
+
+    def _ensure_writer(self):
+        # Threads do not survive a fork, so each process starts its own writer
+        if self._writer_pid == os.getpid():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid():
+                return
+            self._file = None
+            self._queue = queue.SimpleQueue()
+            self._writer = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+            self._writer.start()
+            self._writer_pid = os.getpid()
+            if not self._close_registered:
+                # Write out what is still queued when the process exits
+                atexit.register(self.close)
+                self._close_registered = True
+
+    def _run(self):
+        while True:
+            events = [self._queue.get()]
+            # Write everything that queued up meanwhile in one go
+            while True:
+                try:
+                    events.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            lines = "".join(
+                json.dumps(event, separators=(",", ":"), default=str) + ",\n"
+                for event in events if event is not _STOP
+            )
+            try:
+                if lines:
+                    self._append(lines)
+            except Exception as e:
+                # Tracing must never fail a job
+                logger.warning(f"Could not write trace events: {str(e)}")
+            if _STOP in events:
+                return
+
+    def _open(self):
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            current = None
+        if self._file is not None and (current is None or not os.path.samestat(current, os.fstat(self._file.fileno()))):
+            # Another process rotated the file away
+            self._file.close()
+            self._file = None
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+            if self._file.tell() == 0:
+                self._file.write("[\n")
+        return self._file
+
+    def _append(self, lines):
+        file = self._open()
+        file.write(lines)
+        file.flush()
+        if self.max_bytes and file.tell() >= self.max_bytes:
+            file.close()
+            self._file = None
+            os.replace(self.path, f"{self.path}.1")
+
+    def _emit(self, event):
+        if not self.enabled:
+            return
+        self._ensure_writer()
+        self._queue.put(event)
+
+    def begin(self, trace_id, job_id):
+        """Name a new trace's row after its job"""
+        self._emit({
+            "name": "process_name", "ph": "M", "pid": _trace_pid(trace_id),
+            "args": {"name": f"job {job_id}"},
+        })
+
+    def record(self, trace_id, name, start, end, **args):
+        """Record a finished span; start and end are time.time() values"""
+        if trace_id is None:
+            return
+        self._emit({
+            "name": name,
+            "cat": "job",
+            "ph": "X",
+            "ts": int(start * 1_000_000),
+            "dur": max(int((end - start) * 1_000_000), 0),
+            "pid": _trace_pid(trace_id),
+            "tid": os.getpid(),
+            "args": {"trace_id": trace_id, **args},
+        })
+
+    @contextmanager
+    def span(self, trace_id, name, **args):
+        """Time the enclosed block as a span; failures are marked with the error"""
+        start = time.time()
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.record(trace_id, name, start, time.time(), **args)
+
+    def close(self, timeout=5):
+        """Write out the queued events and stop the writer"""
+        with self._lock:
+            if self._writer_pid != os.getpid():
+                return
+            self._queue.put(_STOP)
+            self._writer.join(timeout)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._writer = None
+            self._writer_pid = None
+
+
+tracer = Tracer()
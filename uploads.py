@@ -0,0 +1,149 @@
+import codecs
+import hashlib
+import os
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, Request
+from starlette.datastructures import UploadFile
+from starlette.formparsers import MultiPartException, MultiPartParser
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Largest upload accepted, in bytes
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", 50 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+# Room in a form body for the boundaries, part headers and small fields around the file
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+class ReceivedUpload:
+    """
+    An uploaded document, checked and ready for the workflow
+
+    For a PDF, document is the upload's own spooled file: small uploads stay
+    in memory and larger ones roll over to a temporary file, and the PDF
+    parser reads it in place, so the bytes are never copied into a second
+    buffer or file. Any other upload is decoded as text.
+    """
+
+    __slots__ = ("document", "size", "sha256", "is_pdf")
+
+    def __init__(self, document, size, sha256, is_pdf):
+        self.document = document
+        self.size = size
+        self.sha256 = sha256
+        self.is_pdf = is_pdf
+
+
+class _TooLarge(MultiPartException):
+    pass
+
+
+def _too_large(max_bytes):
+    return HTTPException(status_code=413, detail=f"Upload exceeds the maximum of {max_bytes} bytes")
+
+
+async def _capped(stream, limit):
+    # Stops the body at the limit, so an oversized upload is refused while it
+    # arrives rather than after it has been spooled in full
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > limit:
+            raise _TooLarge("body too large")
+        yield chunk
+
+
+async def read_form(request: Request, max_bytes=UPLOAD_MAX_BYTES):
+    """
+    Parse a multipart form whose files total at most max_bytes
+
+    Raises:
+        HTTPException: 413 straight away if Content-Length is over the
+            limit, or as soon as the body grows past it; 400 for a body
+            that is not a multipart form
+    """
+    limit = max_bytes + FORM_OVERHEAD_BYTES
+    content_length = request.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+        raise _too_large(max_bytes)
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    parser = MultiPartParser(request.headers, _capped(request.stream(), limit), max_files=1, max_fields=100)
+    try:
+        return await parser.parse()
+    except _TooLarge:
+        raise _too_large(max_bytes)
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+
+
+async def receive_upload(file: UploadFile, max_bytes=UPLOAD_MAX_BYTES, chunk_size=UPLOAD_CHUNK_SIZE) -> ReceivedUpload:
+    """
+    Read through an upload in chunks: hash it, sniff whether it is a PDF
+    and, if it is not, decode it as text as it goes
+
+    Raises:
+        HTTPException: 413 if the upload is larger than max_bytes
+    """
+    digest = hashlib.sha256()
+    size = 0
+    # Bytes read before it is known whether this is a PDF
+    head = b""
+    is_pdf = None
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts = []
+    await file.seek(0)
+    while chunk := await file.read(chunk_size):
+        size += len(chunk)
+        if size > max_bytes:
+            raise _too_large(max_bytes)
+        digest.update(chunk)
+        if is_pdf is None:
+            head += chunk
+            if len(head) < 5:
+                continue
+            is_pdf = head.startswith(b"%PDF-")
+            chunk = head
+        if not is_pdf:
+            parts.append(decoder.decode(chunk))
+    await file.seek(0)
+
+    if is_pdf:
+        document = file.file
+    else:
+        # Anything shorter than the PDF signature is still undecided here
+        if is_pdf is None:
+            is_pdf = False
+            parts.append(decoder.decode(head))
+        parts.append(decoder.decode(b"", final=True))
+        document = "".join(parts)
+    logger.info(f"Received {'PDF' if is_pdf else 'text'} upload {file.filename!r} ({size} bytes)")
+    return ReceivedUpload(document, size, digest.hexdigest(), is_pdf)
+
+
+@asynccontextmanager
+async def form_upload(request: Request, *fields, file_field="file", max_bytes=UPLOAD_MAX_BYTES):
+    """
+    Receive a form with one file and the named text fields
+
+    Yields:
+        (ReceivedUpload, {field: value}); the upload's spool is closed on exit
+
+    Raises:
+        HTTPException: 413 for an upload over max_bytes, 422 if the file or
+            a field is missing
+    """
+    form = await read_form(request, max_bytes)
+    try:
+        file = form.get(file_field)
+        missing = [name for name in fields if not isinstance(form.get(name), str)]
+        if not isinstance(file, UploadFile):
+            missing.insert(0, file_field)
+        if missing:
+            raise HTTPException(status_code=422, detail=f"Missing form fields: {', '.join(missing)}")
+        upload = await receive_upload(file, max_bytes)
+        yield upload, {name: form[name] for name in fields}
+    finally:
+        await form.close()
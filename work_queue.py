@@ -0,0 +1,274 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from logging_config import get_logger
+
+logger = get_logger(__name__)
+
+WORK_QUEUE_PATH = os.getenv("WORK_QUEUE_PATH", os.path.join("data", "work_queue.db"))
+# Seconds a claim stays valid without a heartbeat
+LEASE_SECONDS = float(os.getenv("WORK_LEASE_SECONDS", 60))
+# Claims a task may go through before it is marked failed for good
+MAX_ATTEMPTS = int(os.getenv("WORK_MAX_ATTEMPTS", 3))
+# Done and failed tasks are deleted once they are this old, every WORK_PURGE_INTERVAL seconds
+TASK_RETENTION_SECONDS = float(os.getenv("WORK_TASK_RETENTION", 24 * 3600))
+PURGE_INTERVAL = float(os.getenv("WORK_PURGE_INTERVAL", 600))
+
+
+def make_worker_id():
+    """A worker id that is unique across hosts and processes"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class WorkQueue:
+    """
+    A shared work queue with lease-based claiming, backed by SQLite
+
+    Any process that opens the same database file can enqueue work, and any
+    process can claim it. A claim is a lease: the owner must renew it with
+    heartbeat() (or renew_all()) before it expires, otherwise the task goes
+    back to pending and another worker picks it up. Task ids are caller
+    supplied, so enqueueing the same task twice is harmless.
+
+    A task whose lease expires max_attempts times is marked failed and
+    handed to on_exhausted(task_id, kind, payload), so the owner of the
+    work can record the failure (or rearm() the task).
+
+    Statuses: pending -> claimed -> done | failed
+    """
+
+    def __init__(self, path=WORK_QUEUE_PATH, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS,
+                 on_exhausted=None):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.on_exhausted = on_exhausted
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                lease_expires REAL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tasks_pending ON tasks (kind, status, created_at);
+            CREATE INDEX IF NOT EXISTS tasks_leases ON tasks (status, lease_expires);
+            CREATE INDEX IF NOT EXISTS tasks_owner ON tasks (owner) WHERE status = 'claimed';
+        """)
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+                self._conn.execute("COMMIT")
+                return result
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, task_id, kind, payload, owner=None):
+        """
+        Add a task; does nothing if task_id already exists
+
+        Args:
+            owner: If given, the task is created already claimed by this worker
+
+        Returns:
+            True if the task was added
+        """
+        return self.enqueue_many(kind, [(task_id, payload)], owner) == 1
+
+    def enqueue_many(self, kind, items, owner=None):
+        """Add (task_id, payload) pairs in one transaction; returns how many were new"""
+        now = time.time()
+        status, lease_expires, attempts = ("claimed", now + self.lease_seconds, 1) if owner else ("pending", None, 0)
+        rows = [
+            (task_id, kind, json.dumps(payload), status, attempts, owner, lease_expires, now, now)
+            for task_id, payload in items
+        ]
+
+        def insert(conn):
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (task_id, kind, payload, status, attempts, owner, lease_expires, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            return conn.total_changes - before
+
+        return self._transaction(insert)
+
+    def rearm(self, task_id, kind, payload):
+        """
+        Enqueue a task, or put it back to pending with fresh attempts if it
+        already finished (done or failed); a pending or claimed task is left alone
+
+        Returns:
+            True if the task was added or reset
+        """
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO tasks (task_id, kind, payload, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'pending', ?, ?) "
+                "ON CONFLICT (task_id) DO UPDATE SET status = 'pending', kind = excluded.kind, "
+                "payload = excluded.payload, attempts = 0, owner = NULL, lease_expires = NULL, error = NULL, "
+                "updated_at = excluded.updated_at WHERE status IN ('done', 'failed')",
+                (task_id, kind, json.dumps(payload), now, now)
+            )
+        return cursor.rowcount == 1
+
+    def _requeue_expired(self, conn, now):
+        """
+        Expired claims go back to pending, unless they have used up their attempts
+
+        Returns:
+            (number re-queued, [(task_id, kind, payload), ...] of the tasks failed for good)
+        """
+        exhausted = conn.execute(
+            "SELECT task_id, kind, payload FROM tasks WHERE status = 'claimed' AND lease_expires < ? AND attempts >= ?",
+            (now, self.max_attempts)
+        ).fetchall()
+        if exhausted:
+            conn.executemany(
+                "UPDATE tasks SET status = 'failed', owner = NULL, lease_expires = NULL, "
+                "error = 'lease expired too many times', updated_at = ? WHERE task_id = ?",
+                [(now, task_id) for task_id, _, _ in exhausted]
+            )
+            logger.warning(f"Failed {len(exhausted)} tasks whose leases expired too many times")
+        cursor = conn.execute(
+            "UPDATE tasks SET status = 'pending', owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE status = 'claimed' AND lease_expires < ?",
+            (now, now)
+        )
+        if cursor.rowcount:
+            logger.warning(f"Re-queued {cursor.rowcount} tasks with expired leases")
+        return cursor.rowcount, [(task_id, kind, json.loads(payload)) for task_id, kind, payload in exhausted]
+
+    def _report_exhausted(self, exhausted):
+        # Called outside the transaction, so the handler may use the queue
+        if self.on_exhausted is None:
+            return
+        for task_id, kind, payload in exhausted:
+            try:
+                self.on_exhausted(task_id, kind, payload)
+            except Exception as e:
+                logger.error(f"Error handling exhausted task {task_id}: {str(e)}", exc_info=True)
+
+    def requeue_expired(self):
+        """Return expired claims to the queue; returns how many were re-queued"""
+        requeued, exhausted = self._transaction(lambda conn: self._requeue_expired(conn, time.time()))
+        self._report_exhausted(exhausted)
+        return requeued
+
+    def claim(self, worker_id, kind):
+        """
+        Claim the oldest pending task of a kind
+
+        Args:
+            kind: A task kind, or several in priority order; a task of a later
+                kind is only claimed when none of the earlier ones are pending
+
+        Returns:
+            (task_id, payload), or None if nothing is pending
+        """
+        kinds = (kind,) if isinstance(kind, str) else tuple(kind)
+
+        exhausted = []
+
+        def claim_one(conn):
+            now = time.time()
+            exhausted[:] = self._requeue_expired(conn, now)[1]
+            for task_kind in kinds:
+                row = conn.execute(
+                    "SELECT task_id, payload FROM tasks WHERE kind = ? AND status = 'pending' ORDER BY created_at LIMIT 1",
+                    (task_kind,)
+                ).fetchone()
+                if row is not None:
+                    break
+            else:
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'claimed', owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE task_id = ?",
+                (worker_id, now + self.lease_seconds, now, row[0])
+            )
+            return row[0], json.loads(row[1])
+
+        claimed = self._transaction(claim_one)
+        self._report_exhausted(exhausted)
+        return claimed
+
+    def heartbeat(self, task_id, worker_id):
+        """Extend a claim; returns False if the worker no longer holds it"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE task_id = ? AND owner = ? AND status = 'claimed'",
+                (now + self.lease_seconds, now, task_id, worker_id)
+            )
+        return cursor.rowcount == 1
+
+    def renew_all(self, worker_id):
+        """Extend every claim held by a worker; returns how many were renewed"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET lease_expires = ?, updated_at = ? WHERE owner = ? AND status = 'claimed'",
+                (now + self.lease_seconds, now, worker_id)
+            )
+        return cursor.rowcount
+
+    def complete(self, task_id, worker_id=None):
+        """Mark a task done; returns False if it was claimed by someone else"""
+        return self._finish(task_id, worker_id, "done", None)
+
+    def fail(self, task_id, worker_id=None, error=None):
+        """Mark a task failed for good"""
+        return self._finish(task_id, worker_id, "failed", error)
+
+    def _finish(self, task_id, worker_id, status, error):
+        now = time.time()
+        query = "UPDATE tasks SET status = ?, owner = NULL, lease_expires = NULL, error = ?, updated_at = ? WHERE task_id = ?"
+        params = [status, error, now, task_id]
+        if worker_id is not None:
+            query += " AND owner = ?"
+            params.append(worker_id)
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+        return cursor.rowcount == 1
+
+    def count(self, kind, status="pending"):
+        """Count tasks of a kind in a status, or in any of several statuses"""
+        statuses = (status,) if isinstance(status, str) else tuple(status)
+        placeholders = ", ".join("?" * len(statuses))
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM tasks WHERE kind = ? AND status IN ({placeholders})", (kind, *statuses)
+            ).fetchone()[0]
+
+    def purge_finished(self, older_than_seconds=TASK_RETENTION_SECONDS):
+        """Delete done and failed tasks older than the given age; returns how many were deleted"""
+        cutoff = time.time() - older_than_seconds
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM tasks WHERE status IN ('done', 'failed') AND updated_at < ?", (cutoff,)
+            )
+        return cursor.rowcount